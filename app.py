@@ -1,36 +1,56 @@
 from flask import Flask
 
-from configs import DefaultConfig
+from configs import DefaultConfig, check_worker_backends
 from routes.schema import (create_schema,
-                    User, 
                     db, mail, login_manager, bcrypt)
-from logger.log_utility import setup_logger
+from routes.passwords import password_hasher
+from routes.pool import engine_options
+from logger.log_utility import base_logger
 
 
 CONFIG = DefaultConfig()
-base_logger = setup_logger()
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-
-def create_app():
+def create_app(schema_on_startup=None):
     """
-    Main app function
+    Main app function. With schema_on_startup off (SCHEMA_ON_STARTUP=False) the
+    database is expected to be prepared by `python -m migrations.migrate`.
     """
     app = Flask(__name__)
     base_logger.info(f"Creating app")
+    check_worker_backends(CONFIG, CONFIG.WEB_WORKERS)
+
+    app.config['METRICS_DIR'] = CONFIG.METRICS_DIR
+    app.config['METRICS_FLUSH_SECONDS'] = CONFIG.METRICS_FLUSH_SECONDS
+
+    # First, so request latency covers every other before/after request hook
+    from routes.metrics import metrics
+    metrics.init_app(app)
+
     app.config['SQLALCHEMY_DATABASE_URI'] = CONFIG.SQLALCHEMY_DB
     app.config['SECRET_KEY'] = CONFIG.SECRET_KEY
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = CONFIG.SQLALCHEMY_TM
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(CONFIG.SQLALCHEMY_DB, CONFIG)
+    # statement uploads are the largest request bodies, werkzeug refuses anything bigger
+    app.config['MAX_CONTENT_LENGTH'] = CONFIG.IMPORT_MAX_BYTES or None
+
+    app.config['BCRYPT_LOG_ROUNDS'] = CONFIG.BCRYPT_LOG_ROUNDS
+    app.config['BCRYPT_POOL_WORKERS'] = CONFIG.BCRYPT_POOL_WORKERS
 
     # Init extensions with app
     db.init_app(app)
     bcrypt.init_app(app)
+    password_hasher.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = "auth.login"
+
+    app.config['USER_CACHE_TTL'] = CONFIG.USER_CACHE_TTL
+    app.config['USER_CACHE_MAX_ENTRIES'] = CONFIG.USER_CACHE_MAX_ENTRIES
+
+    # Request user loaded from a short-lived per-process cache instead of the users table
+    from routes.identity import identity_cache
+    identity_cache.init_app(app)
+    login_manager.user_loader(identity_cache.load)
     
     app.config['MAIL_SERVER'] = CONFIG.MAIL_SERVER
     app.config['MAIL_PORT'] = CONFIG.MAIL_PORT
@@ -41,19 +61,62 @@ def create_app():
 
 
     mail.init_app(app)
+
+    app.config['MAIL_ASYNC'] = CONFIG.MAIL_ASYNC
+    app.config['MAIL_WORKERS'] = CONFIG.MAIL_WORKERS
+    app.config['MAIL_QUEUE_SIZE'] = CONFIG.MAIL_QUEUE_SIZE
+    app.config['MAIL_MAX_RETRIES'] = CONFIG.MAIL_MAX_RETRIES
+    app.config['MAIL_RETRY_BACKOFF'] = CONFIG.MAIL_RETRY_BACKOFF
+    app.config['MAIL_TIMEOUT'] = CONFIG.MAIL_TIMEOUT
+
+    from routes.mailer import mail_queue
+    mail_queue.init_app(app)
+
+    app.config['OTP_STORE_BACKEND'] = CONFIG.OTP_STORE_BACKEND
+    app.config['OTP_STORE_URL'] = CONFIG.OTP_STORE_URL
+    app.config['OTP_TTL_SECONDS'] = CONFIG.OTP_TTL_SECONDS
+    app.config['OTP_MAX_ATTEMPTS'] = CONFIG.OTP_MAX_ATTEMPTS
+    app.config['OTP_MAX_RESENDS'] = CONFIG.OTP_MAX_RESENDS
+
+    from routes.otp_store import otp_store
+    otp_store.init_app(app)
+
+    app.config['DASHBOARD_CACHE_BACKEND'] = CONFIG.DASHBOARD_CACHE_BACKEND
+    app.config['DASHBOARD_CACHE_URL'] = CONFIG.DASHBOARD_CACHE_URL
+    app.config['DASHBOARD_CACHE_TTL'] = CONFIG.DASHBOARD_CACHE_TTL
+    app.config['DASHBOARD_CACHE_MAX_ENTRIES'] = CONFIG.DASHBOARD_CACHE_MAX_ENTRIES
+
+    from routes.cache import dashboard_cache
+    dashboard_cache.init_app(app)
     
+    app.config['QUERY_PROFILE_SAMPLE_RATE'] = CONFIG.QUERY_PROFILE_SAMPLE_RATE
+    app.config['QUERY_PROFILE_HEADER'] = CONFIG.QUERY_PROFILE_HEADER
+    app.config['QUERY_PROFILE_SLOW_MS'] = CONFIG.QUERY_PROFILE_SLOW_MS
+    app.config['QUERY_PROFILE_TOP_STATEMENTS'] = CONFIG.QUERY_PROFILE_TOP_STATEMENTS
+    app.config['QUERY_PROFILE_N_PLUS_ONE'] = CONFIG.QUERY_PROFILE_N_PLUS_ONE
+    app.config['METRICS_TOKEN'] = CONFIG.METRICS_TOKEN
+
+    from routes.profiler import query_profiler
+    query_profiler.init_app(app)
+
     # Register blueprints
-    from routes import auth, dashboard
+    from routes import auth, dashboard, api, export, internal
     app.register_blueprint(auth.bp)
     app.register_blueprint(dashboard.bp)
+    app.register_blueprint(api.bp)
+    app.register_blueprint(export.bp)
+    app.register_blueprint(internal.bp)
 
-    with app.app_context():
+    if schema_on_startup is None:
+        schema_on_startup = CONFIG.SCHEMA_ON_STARTUP
+    if schema_on_startup:
         create_schema(app)
 
     return app
 
     
 if __name__ == "__main__":
+    # Development server only, production runs wsgi:app (see gunicorn.conf.py)
     app = create_app()
     
     app.run(debug=True)
@@ -0,0 +1,67 @@
+"""
+Fail (exit status 1) when rendering /dashboard issues more SQL statements than
+the budget. Guards against N+1 regressions such as lazy-loading Expense.category
+once per table row.
+
+Usage:
+  python -m benchmarks.check_dashboard_queries
+  python -m benchmarks.check_dashboard_queries --expenses 20000 --max-statements 6
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.harness import build_app, count_statements, logged_in_client, seed_fixture
+
+# expense/loan/insurance listings + one aggregate query, plus on the first request of a
+# worker the user (load_user) and the category registry; both are cached afterwards
+MAX_DASHBOARD_STATEMENTS = 6
+
+FILTER_QUERIES = [
+    "",
+    "?start_date=2021-01-01&end_date=2022-12-31",
+    "?expense_category=Groceries&expense_category=Gas&loan_lender=SBI&insurance_provider=LIC",
+]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Scratch database (default: temporary SQLite file)")
+    parser.add_argument("--expenses", type=int, default=5000, help="Expenses for the fixture user")
+    parser.add_argument("--max-statements", type=int, default=MAX_DASHBOARD_STATEMENTS)
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        path = os.path.join(tempfile.gettempdir(), "check_dashboard_queries.db")
+        if os.path.exists(path):
+            os.remove(path)
+        database_url = f"sqlite:///{path}"
+
+    app = build_app(database_url)
+    from routes import db
+
+    with app.app_context():
+        user_id = seed_fixture(args.expenses)[0]
+        engine = db.engine
+
+    client = logged_in_client(app, user_id)
+    failed = False
+    for query in FILTER_QUERIES:
+        with count_statements(engine) as counter:
+            response = client.get(f"/dashboard{query}")
+        status = "ok" if counter.count <= args.max_statements and response.status_code == 200 else "FAIL"
+        failed = failed or status == "FAIL"
+        print(f"{status:4}  {counter.count:3} statements  HTTP {response.status_code}  /dashboard{query}")
+        if status == "FAIL":
+            for statement in counter.statements:
+                print("      " + " ".join(statement.split())[:160])
+
+    print(f"Budget: {args.max_statements} statements per dashboard render")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
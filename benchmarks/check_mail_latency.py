@@ -0,0 +1,106 @@
+"""
+Check that /login latency does not depend on SMTP latency: runs the OTP login
+against a local SMTP stand-in (aiosmtpd) that answers every message slowly, and
+fails (exit status 1) if a login waits for the mail server or an OTP email is lost.
+
+Requires aiosmtpd (`pip install -r requirements-dev.txt`).
+
+Usage:
+  python -m benchmarks.check_mail_latency
+  python -m benchmarks.check_mail_latency --logins 20 --smtp-delay 2
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+import time
+
+from aiosmtpd.controller import Controller
+
+PASSWORD = "Kq7!mZx2"
+
+
+class SlowHandler:
+    """Accepts every message after `delay` seconds and counts SMTP sessions."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.messages = []
+        self.sessions = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        await asyncio.sleep(self.delay)
+        self.messages.append(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=10)
+    parser.add_argument("--smtp-delay", type=float, default=1.0, help="Seconds the stand-in takes per message")
+    parser.add_argument("--max-login-ms", type=float, default=500.0)
+    args = parser.parse_args(argv)
+
+    handler = SlowHandler(args.smtp_delay)
+    port = _free_port()
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+
+    os.environ.update({"MAIL_SERVER": "127.0.0.1", "MAIL_PORT": str(port), "MAIL_USE_TLS": "False",
+                       "MAIL_USE_SSL": "False", "MAIL_USERNAME": "otp@example.com", "MAIL_PASSWORD": ""})
+    path = os.path.join(tempfile.gettempdir(), "check_mail_latency.db")
+    if os.path.exists(path):
+        os.remove(path)
+
+    from benchmarks.harness import build_app
+    app = build_app(f"sqlite:///{path}")
+    from routes import db, User
+    from routes.mailer import mail_queue
+
+    with app.app_context():
+        db.create_all()
+        user = User(first_name="Mail", last_name="Check", email="mail-check@example.com", is_verified=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+
+    client = app.test_client()
+    timings = []
+    for _ in range(args.logins):
+        started = time.perf_counter()
+        response = client.post("/login", data={"email": "mail-check@example.com", "password": PASSWORD})
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 302:
+            print(f"login failed with HTTP {response.status_code}")
+            return 1
+
+    delivered = mail_queue.join(timeout=args.logins * args.smtp_delay + 30)
+    controller.stop()
+
+    worst = max(timings)
+    print(f"logins: {args.logins}, SMTP delay: {args.smtp_delay * 1000:.0f} ms per message")
+    print(f"login latency: median {sorted(timings)[len(timings) // 2]:.1f} ms, max {worst:.1f} ms")
+    print(f"emails delivered: {len(handler.messages)}/{args.logins} over {handler.sessions} SMTP sessions")
+    print(f"mail queue: {mail_queue.stats()}")
+
+    ok = delivered and len(handler.messages) == args.logins and worst <= args.max_login_ms
+    print("ok" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
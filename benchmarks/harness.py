@@ -0,0 +1,190 @@
+"""
+Shared helpers for the benchmark and budget scripts: statement and row counters
+hooked into SQLAlchemy, latency percentiles and peak memory of a call, an app
+factory pointed at a scratch database, a small fixture loader and an
+authenticated Flask test client.
+"""
+
+import math
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, insert
+
+
+class StatementCounter:
+    """Collects every SQL statement sent to the database while active."""
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+
+@contextmanager
+def count_statements(engine):
+    """
+    Count statements executed on the engine inside the block:
+
+        with count_statements(db.engine) as counter:
+            client.get("/dashboard")
+        print(counter.count)
+    """
+    counter = StatementCounter()
+    event.listen(engine, "before_cursor_execute", counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", counter._before_cursor_execute)
+
+
+class RowCounter:
+    """Counts rows returned by ORM session executions while active."""
+
+    def __init__(self):
+        self.rows = 0
+
+    def _do_orm_execute(self, orm_execute_state):
+        # buffer the result to count it, then hand the caller an equivalent one
+        frozen = orm_execute_state.invoke_statement().freeze()
+        self.rows += len(frozen.data)
+        return frozen()
+
+
+@contextmanager
+def count_rows(session):
+    """
+    Count rows fetched through the session (or scoped_session, e.g. db.session)
+    inside the block. Buffers every result, so keep it out of timed runs.
+    """
+    counter = RowCounter()
+    event.listen(session, "do_orm_execute", counter._do_orm_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(session, "do_orm_execute", counter._do_orm_execute)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(pct / 100 * len(ordered)) - 1, 0)]
+
+
+def time_calls(fn, iterations, warmup=1, before=None):
+    """
+    Latency summary in milliseconds of `iterations` calls of fn, after `warmup`
+    untimed calls. `before` runs untimed ahead of every timed call.
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        if before:
+            before()
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50_ms": percentile(timings, 50),
+        "p95_ms": percentile(timings, 95),
+        "p99_ms": percentile(timings, 99),
+        "mean_ms": statistics.fmean(timings),
+        "max_ms": max(timings),
+    }
+
+
+def peak_memory(fn):
+    """Peak Python heap growth in KiB while fn runs (tracemalloc, so much slower than untraced)"""
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+
+def build_app(database_url):
+    """Create the Flask app against the given database (must run before `app` is imported elsewhere)."""
+    os.environ["DATABASE_URL"] = database_url
+    from app import create_app
+
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+def seed_fixture(expenses_per_user, users=1, loans_per_user=10, insurances_per_user=10, seed=0):
+    """
+    Insert users with random ledgers through Core bulk inserts. Must run inside an app context.
+    Returns the created user ids.
+    """
+    from routes import db, User, Expense, Loan, Insurance, Category
+    from routes.rollups import rebuild_rollups
+
+    rnd = random.Random(seed)
+    category_ids = [c.category_id for c in Category.query.all()]
+    start = datetime(2020, 1, 1)
+
+    user_ids = []
+    for n in range(users):
+        user = User(first_name="Bench", last_name="User", email=f"bench{n}-{seed}@example.com",
+                    password_hash="x", is_verified=True)
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.user_id)
+
+    for user_id in user_ids:
+        db.session.execute(insert(Expense), [
+            {
+                "amount": round(rnd.uniform(10, 5000), 2),
+                "description": f"expense {i}",
+                "date": start + timedelta(days=rnd.randint(0, 5 * 365)),
+                "user_id": user_id,
+                "category_id": rnd.choice(category_ids),
+            }
+            for i in range(expenses_per_user)
+        ])
+        db.session.execute(insert(Loan), [
+            {
+                "lender": "SBI",
+                "amount": round(rnd.uniform(1000, 100000), 2),
+                "interest_rate": round(rnd.uniform(2.5, 15.0), 2),
+                "due_date": (start + timedelta(days=rnd.randint(0, 5 * 365))).date(),
+                "loan_category": "Home Loan",
+                "user_id": user_id,
+            }
+            for _ in range(loans_per_user)
+        ])
+        db.session.execute(insert(Insurance), [
+            {
+                "provider": "LIC",
+                "policy_type": "Life",
+                "premium": round(rnd.uniform(2000, 50000), 2),
+                "renewal_date": (start + timedelta(days=rnd.randint(0, 5 * 365))).date(),
+                "user_id": user_id,
+            }
+            for _ in range(insurances_per_user)
+        ])
+    rebuild_rollups(db.session.connection())
+    db.session.commit()
+    return user_ids
+
+
+def logged_in_client(app, user_id):
+    """Flask test client with a Flask-Login session for user_id."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
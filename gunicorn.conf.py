@@ -0,0 +1,43 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+import os
+
+from configs import DefaultConfig, check_worker_backends
+
+CONFIG = DefaultConfig()
+
+bind = CONFIG.WEB_BIND
+workers = CONFIG.WEB_WORKERS
+threads = CONFIG.WEB_THREADS
+timeout = CONFIG.WEB_TIMEOUT
+worker_class = "gthread"
+# recycle workers now and then, spread so they do not all restart together
+max_requests = 2000
+max_requests_jitter = 200
+
+
+def when_ready(server):
+    # each worker holds up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+    per_worker = CONFIG.DB_POOL_SIZE + CONFIG.DB_MAX_OVERFLOW
+    server.log.info(f"{workers} workers x {per_worker} connections = up to "
+                    f"{workers * per_worker} database connections, compare with Postgres max_connections")
+
+
+def on_starting(server):
+    # create_app() checks WEB_WORKERS, this also catches a -w / --workers override
+    try:
+        check_worker_backends(CONFIG, server.cfg.workers)
+    except RuntimeError as exc:
+        raise SystemExit(str(exc))
+
+    # counters start from zero with every server start, drop the previous run's snapshots
+    if CONFIG.METRICS_DIR:
+        from routes.metrics import clear_directory
+        os.makedirs(CONFIG.METRICS_DIR, exist_ok=True)
+        clear_directory(CONFIG.METRICS_DIR)
+
+
+def child_exit(server, worker):
+    # keep the exited worker's counters, forget its gauges
+    if CONFIG.METRICS_DIR:
+        from routes.metrics import mark_process_dead
+        mark_process_dead(worker.pid, CONFIG.METRICS_DIR)
@@ -15,10 +15,16 @@ def setup_logger(log_file: str = "finance_app.log") -> logging.Logger:
 
     # Prevents duplicate handlers
     if not logger.handlers:
-        file_handler = logging.FileHandler(log_file_path)
+        # delay: the file is only created once something is logged, importing stays side-effect free
+        file_handler = logging.FileHandler(log_file_path, delay=True)
         file_handler.setLevel(logging.DEBUG)
         formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
         file_handler.setFormatter(formatter)
         logger.addHandler(file_handler)
 
     return logger
+
+
+# Shared application logger, import it from here rather than from app so that
+# loading a route module never executes app.py (again, when run as __main__)
+base_logger = setup_logger()
@@ -0,0 +1,122 @@
+"""
+Prepare the database for the app: create missing tables and the default
+categories (the work create_app skips with SCHEMA_ON_STARTUP=False), then apply
+versioned schema migrations.
+
+Every module in migrations/versions/ named <NNNN>_<slug>.py exposes:
+  VERSION        - sortable version string, e.g. "0001"
+  DESCRIPTION    - one line summary
+  TRANSACTIONAL  - False when the DDL cannot run inside a transaction
+                   (e.g. CREATE INDEX CONCURRENTLY on PostgreSQL)
+  upgrade(conn)  - apply the change on the given connection
+
+Applied versions are recorded in the schema_migrations table.
+
+Usage:
+  python -m migrations.migrate             # apply pending migrations
+  python -m migrations.migrate --list      # show applied/pending status
+  python -m migrations.migrate --database-url sqlite:///finance.db
+  python -m migrations.migrate --skip-create   # migrations only
+"""
+
+import argparse
+import importlib
+import pkgutil
+import sys
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, MetaData, String, Table, create_engine, select
+
+from migrations import versions
+
+metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    metadata,
+    Column("version", String(32), primary_key=True),
+    Column("description", String(200)),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def discover_migrations():
+    """Import every migration module in migrations/versions, ordered by VERSION."""
+    modules = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        modules.append(importlib.import_module(f"{versions.__name__}.{info.name}"))
+    return sorted(modules, key=lambda m: m.VERSION)
+
+
+def applied_versions(engine):
+    metadata.create_all(engine, tables=[schema_migrations])
+    with engine.connect() as conn:
+        return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def _apply(engine, migration):
+    if getattr(migration, "TRANSACTIONAL", True):
+        with engine.begin() as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            migration.upgrade(conn)
+            _record(conn, migration)
+
+
+def _record(conn, migration):
+    conn.execute(schema_migrations.insert().values(
+        version=migration.VERSION,
+        description=migration.DESCRIPTION,
+        applied_at=datetime.utcnow(),
+    ))
+
+
+def upgrade(engine):
+    """Apply all pending migrations in order. Returns the versions applied."""
+    done = applied_versions(engine)
+    applied = []
+    for migration in discover_migrations():
+        if migration.VERSION in done:
+            continue
+        print(f"Applying {migration.VERSION}: {migration.DESCRIPTION}")
+        _apply(engine, migration)
+        applied.append(migration.VERSION)
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL from configs")
+    parser.add_argument("--list", action="store_true", help="Show migration status and exit")
+    parser.add_argument("--skip-create", action="store_true", help="Do not create missing tables or default categories")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        from configs import DefaultConfig
+        database_url = DefaultConfig.SQLALCHEMY_DB
+
+    engine = create_engine(database_url)
+
+    if args.list:
+        done = applied_versions(engine)
+        for migration in discover_migrations():
+            status = "applied" if migration.VERSION in done else "pending"
+            print(f"{migration.VERSION}  {status:8}  {migration.DESCRIPTION}")
+        return 0
+
+    if not args.skip_create:
+        from routes.schema import prepare_schema
+        with engine.begin() as conn:
+            prepare_schema(conn)
+
+    applied = upgrade(engine)
+    print(f"Done! Applied {len(applied)} migration(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""
+Recompute the monthly rollup tables from the raw ledgers, e.g. after a bulk
+import or a seeder run that bypassed the app. Can run against a serving database:
+ledger writes wait until the rebuild commits.
+
+Usage:
+  python -m migrations.rebuild_rollups                 # every user
+  python -m migrations.rebuild_rollups --user-id 42
+"""
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import create_engine
+
+from routes.rollups import rebuild_rollups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL from configs")
+    parser.add_argument("--user-id", type=int, help="Only rebuild this user's rollups")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        database_url = args.database_url
+    else:
+        from configs import DefaultConfig
+        database_url = DefaultConfig.SQLALCHEMY_DB
+
+    engine = create_engine(database_url)
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        rebuild_rollups(conn, args.user_id)
+
+    scope = f"user {args.user_id}" if args.user_id is not None else "all users"
+    print(f"Done! Rebuilt monthly rollups for {scope} in {time.perf_counter() - started:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
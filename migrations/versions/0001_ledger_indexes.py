@@ -0,0 +1,34 @@
+"""
+Composite indexes for the user/date access paths used by routes/filters.py.
+
+On PostgreSQL the indexes are built CONCURRENTLY (no write lock on the ledgers)
+and carry the summed amount column in INCLUDE, so the dashboard aggregates can
+be answered from an index-only scan.
+"""
+
+from sqlalchemy import Index, MetaData, Table
+
+VERSION = "0001"
+DESCRIPTION = "Composite (user_id, date) indexes on expenses, loans and insurances"
+TRANSACTIONAL = False
+
+# (table, index name, key columns, included columns)
+INDEXES = [
+    ("expenses", "ix_expenses_user_date", ["user_id", "date"], ["amount", "category_id"]),
+    ("expenses", "ix_expenses_user_category_date", ["user_id", "category_id", "date"], ["amount"]),
+    ("loans", "ix_loans_user_due_date", ["user_id", "due_date"], ["amount"]),
+    ("insurances", "ix_insurances_user_renewal_date", ["user_id", "renewal_date"], ["premium"]),
+]
+
+
+def upgrade(conn):
+    metadata = MetaData()
+    for table_name, name, columns, include in INDEXES:
+        table = Table(table_name, metadata, autoload_with=conn)
+        index = Index(
+            name,
+            *(table.c[col] for col in columns),
+            postgresql_include=include,
+            postgresql_concurrently=True,
+        )
+        index.create(conn, checkfirst=True)
@@ -0,0 +1,27 @@
+"""
+Per-user monthly rollup tables for the dashboard charts, backfilled from the
+existing ledgers. New rows keep them current through routes.rollups.record_in_rollups.
+
+Whoever creates the tables backfills them: migrate.py runs prepare_schema() first,
+which creates and backfills missing rollup tables, so this only does the work
+under --skip-create.
+"""
+
+from sqlalchemy import inspect
+
+from routes.schema import ExpenseMonthly, LoanMonthly, InsuranceMonthly
+from routes.rollups import rebuild_rollups
+
+VERSION = "0002"
+DESCRIPTION = "Monthly rollups expense_monthly, loan_monthly and insurance_monthly"
+TRANSACTIONAL = True
+
+
+def upgrade(conn):
+    inspector = inspect(conn)
+    missing = [rollup for rollup in (ExpenseMonthly, LoanMonthly, InsuranceMonthly)
+               if not inspector.has_table(rollup.__tablename__)]
+    for rollup in missing:
+        rollup.__table__.create(conn)
+    if missing:
+        rebuild_rollups(conn)
@@ -0,0 +1,145 @@
+from sqlalchemy import Integer, String, cast, extract, func, literal, null, select, union_all
+from .schema import (Expense, Loan, Insurance,
+                     ExpenseMonthly, LoanMonthly, InsuranceMonthly, db)
+from .categories import category_registry
+
+
+def _branch(ledger, kind, amount, criteria, year=None, month=None, label=None, join=None):
+    """
+    Build one SELECT of the dashboard UNION ALL, returned as (ledger, select).
+    Every branch exposes the same columns: ledger, kind, year, month, label, total
+    """
+    stmt = select(
+        literal(ledger, String).label("ledger"),
+        literal(kind, String).label("kind"),
+        (year if year is not None else cast(null(), Integer)).label("year"),
+        (month if month is not None else cast(null(), Integer)).label("month"),
+        (label if label is not None else cast(null(), String)).label("label"),
+        func.coalesce(func.sum(amount), 0).label("total"),
+    )
+    if join is not None:
+        stmt = stmt.join_from(*join)
+    stmt = stmt.where(*criteria)
+
+    group_by = [col for col in (year, month, label) if col is not None]
+    if group_by:
+        stmt = stmt.group_by(*group_by)
+    return ledger, stmt
+
+
+def _month_label(row):
+    return f"{int(row.year)}-{int(row.month):02d}"
+
+
+def _category_label(model):
+    # grouped by id (as text, the label column is shared with the other branches),
+    # named from the category registry instead of joining categories
+    return cast(model.category_id, String)
+
+
+def _raw_branches(expense_criteria, loan_criteria, insurance_criteria):
+    return [
+        _branch("expense", "total", Expense.amount, expense_criteria),
+        _branch("expense", "monthly", Expense.amount,
+                [*expense_criteria, Expense.date.isnot(None)],
+                year=extract("year", Expense.date), month=extract("month", Expense.date)),
+        _branch("expense", "category", Expense.amount, [*expense_criteria, Expense.category_id.isnot(None)],
+                label=_category_label(Expense)),
+        _branch("loan", "yearly", Loan.amount,
+                [*loan_criteria, Loan.due_date.isnot(None)],
+                year=extract("year", Loan.due_date)),
+        _branch("insurance", "total", Insurance.premium, insurance_criteria),
+        _branch("insurance", "monthly", Insurance.premium,
+                [*insurance_criteria, Insurance.renewal_date.isnot(None)],
+                year=extract("year", Insurance.renewal_date), month=extract("month", Insurance.renewal_date)),
+    ]
+
+
+def _rollup_branches(expense_criteria, insurance_criteria, rollup_criteria):
+    """
+    Same series read from the monthly rollups. Undated rows have no month bucket,
+    so the totals and the category breakdown add them from the raw ledgers
+    (an index lookup on date IS NULL).
+    """
+    expense_rollup = rollup_criteria["expenses"]
+    loan_rollup = rollup_criteria["loans"]
+    insurance_rollup = rollup_criteria["insurances"]
+    return [
+        _branch("expense", "total", ExpenseMonthly.total, expense_rollup),
+        _branch("expense", "total", Expense.amount, [*expense_criteria, Expense.date.is_(None)]),
+        _branch("expense", "monthly", ExpenseMonthly.total, expense_rollup,
+                year=extract("year", ExpenseMonthly.month), month=extract("month", ExpenseMonthly.month)),
+        _branch("expense", "category", ExpenseMonthly.total,
+                [*expense_rollup, ExpenseMonthly.category_id.isnot(None)],
+                label=_category_label(ExpenseMonthly)),
+        _branch("expense", "category", Expense.amount,
+                [*expense_criteria, Expense.date.is_(None), Expense.category_id.isnot(None)],
+                label=_category_label(Expense)),
+        _branch("loan", "yearly", LoanMonthly.total, loan_rollup,
+                year=extract("year", LoanMonthly.month)),
+        _branch("insurance", "total", InsuranceMonthly.total, insurance_rollup),
+        _branch("insurance", "total", Insurance.premium, [*insurance_criteria, Insurance.renewal_date.is_(None)]),
+        _branch("insurance", "monthly", InsuranceMonthly.total, insurance_rollup,
+                year=extract("year", InsuranceMonthly.month), month=extract("month", InsuranceMonthly.month)),
+    ]
+
+
+# context keys produced for each ledger
+LEDGER_KEYS = {
+    "expense": ["total_expenses", "expense_chart_data", "category_chart_data"],
+    "loan": ["total_loans", "loan_chart_data"],
+    "insurance": ["total_premium", "insurance_chart_data"],
+}
+
+
+def get_dashboard_aggregates(expense_criteria, loan_criteria, insurance_criteria, rollup_criteria=None,
+                             ledgers=("expense", "loan", "insurance")):
+    """
+    Compute totals and chart series for expenses, loans and insurances in a single
+    round trip (one UNION ALL of grouped selects), reusing the WHERE criteria
+    built by routes.filters. When `rollup_criteria` (criteria on the monthly rollup
+    tables, keyed by ledger) is given, the series are read from the rollups instead.
+    Only the `ledgers` asked for are queried and returned (see LEDGER_KEYS).
+    """
+    if rollup_criteria is None:
+        branches = _raw_branches(expense_criteria, loan_criteria, insurance_criteria)
+    else:
+        branches = _rollup_branches(expense_criteria, insurance_criteria, rollup_criteria)
+    statement = union_all(*(stmt for ledger, stmt in branches if ledger in ledgers))
+
+    rows = db.session.execute(statement).all()
+
+    buckets = {}
+    for row in rows:
+        buckets.setdefault((row.ledger, row.kind), []).append(row)
+
+    expense_monthly = sorted(buckets.get(("expense", "monthly"), []), key=lambda r: (r.year, r.month))
+    expense_categories = {}
+    for r in buckets.get(("expense", "category"), []):
+        name = category_registry.name_of(int(r.label))
+        expense_categories[name] = expense_categories.get(name, 0) + float(r.total)
+    loan_yearly = sorted(buckets.get(("loan", "yearly"), []), key=lambda r: r.year)
+    insurance_monthly = sorted(buckets.get(("insurance", "monthly"), []), key=lambda r: (r.year, r.month))
+
+    expense_total = buckets.get(("expense", "total"))
+    insurance_total = buckets.get(("insurance", "total"))
+
+    aggregates = {
+        "total_expenses": sum(float(r.total) for r in expense_total) if expense_total else 0,
+        "total_loans": sum(float(r.total) for r in loan_yearly),
+        "total_premium": sum(float(r.total) for r in insurance_total) if insurance_total else 0,
+        "expense_chart_data": [
+            {"label": _month_label(r), "value": float(r.total)} for r in expense_monthly
+        ],
+        "loan_chart_data": [
+            {"label": str(int(r.year)), "value": float(r.total)} for r in loan_yearly
+        ],
+        "insurance_chart_data": [
+            {"label": _month_label(r), "value": float(r.total)} for r in insurance_monthly
+        ],
+        "category_chart_data": [
+            {"label": label, "value": expense_categories[label]} for label in sorted(expense_categories)
+        ],
+    }
+
+    return {key: aggregates[key] for ledger in ledgers for key in LEDGER_KEYS[ledger]}
@@ -0,0 +1,213 @@
+import hashlib
+from datetime import date
+import numpy as np
+from .schema import Loan
+from .cache import MemoryBackend
+
+# remaining tenure assumed for loans without a due date
+DEFAULT_TENURE_MONTHS = {
+    "Home Loan": 240,
+    "Personal Loan": 36,
+    "Education Loan": 84,
+    "Car Loan": 60,
+    "Gold Loan": 12,
+    "Business Loan": 60,
+    "Agriculture Loan": 36,
+}
+FALLBACK_TENURE_MONTHS = 60
+MAX_TENURE_MONTHS = 360
+# memory held by cached schedules per process, a 30 year schedule takes about 9 KB
+SCHEDULE_CACHE_BYTES = 16 * 1024 * 1024
+
+
+def _schedule_bytes(schedule):
+    return schedule["balance"].nbytes + schedule["interest"].nbytes + schedule["principal"].nbytes
+
+
+# per loan schedules, keyed by a fingerprint of the loan row and the start month,
+# so editing a loan (or a new month starting) simply stops hitting the old entry
+_schedule_cache = MemoryBackend(max_entries=20000, max_bytes=SCHEDULE_CACHE_BYTES, sizeof=_schedule_bytes)
+
+
+def _month_index(day):
+    return day.year * 12 + day.month - 1
+
+
+def _month_label(index):
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+
+def remaining_months(loan, start_month):
+    """
+    Instalments left: one per month from the month after `start_month` up to the
+    due date, or the category's default tenure when the loan has no due date.
+    0 when the loan is due in `start_month` or earlier (overdue).
+    """
+    if loan.due_date is None:
+        months = DEFAULT_TENURE_MONTHS.get(loan.loan_category, FALLBACK_TENURE_MONTHS)
+    else:
+        months = _month_index(loan.due_date) - start_month
+    return max(0, min(months, MAX_TENURE_MONTHS))
+
+
+def amortize(principal, annual_rate, months):
+    """
+    Vectorised EMI schedules for many loans at once.
+
+    `principal`, `annual_rate` (percent) and `months` are arrays of shape (N,). Returns a
+    dict with `emi` (N,) and `balance`, `interest`, `principal` of shape (N, T), where
+    T = months.max(); column k is instalment k + 1 and months after a loan ends are 0.
+    """
+    principal = np.asarray(principal, dtype=float)
+    rate = np.asarray(annual_rate, dtype=float) / 1200.0
+    months = np.asarray(months, dtype=int)
+    horizon = int(months.max()) if months.size else 0
+
+    k = np.arange(1, horizon + 1, dtype=float)
+    has_rate = rate > 0
+    log_growth = np.log1p(rate)
+    growth_n = np.exp(months * log_growth)
+    emi = np.divide(principal * rate * growth_n, growth_n - 1.0, out=principal / np.maximum(months, 1), where=has_rate)
+
+    # closed form balance after k payments: P(1+r)^k - EMI((1+r)^k - 1)/r = (P - EMI/r)(1+r)^k + EMI/r
+    annuity = np.divide(emi, rate, out=np.zeros_like(emi), where=has_rate)
+    balance = np.exp(np.multiply.outer(log_growth, k))
+    balance *= (principal - annuity)[:, None]
+    balance += annuity[:, None]
+    # 0% loans pay the principal down linearly
+    flat = ~has_rate
+    if flat.any():
+        balance[flat] = principal[flat, None] - np.multiply.outer(emi[flat], k)
+
+    inactive = k[None, :] > months[:, None]
+    np.maximum(balance, 0.0, out=balance)
+    balance[inactive] = 0.0
+
+    interest = np.empty_like(balance)
+    interest[:, 0] = principal
+    interest[:, 1:] = balance[:, :-1]
+    interest *= rate[:, None]
+    principal_paid = emi[:, None] - interest
+    principal_paid[inactive] = 0.0
+
+    return {"emi": emi, "balance": balance, "interest": interest, "principal": principal_paid}
+
+
+def _fingerprint(loan, start_month):
+    raw = f"{loan.loan_id}|{loan.amount}|{loan.interest_rate}|{loan.due_date}|{loan.loan_category}|{start_month}"
+    return "loan:" + hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def loan_schedules(loans, start_month=None):
+    """
+    Schedules of `loans` (Loan rows) starting after `start_month` (a month index, defaults
+    to the current month), as a list of dicts with emi, balance, interest and principal
+    arrays trimmed to the loan's tenure and an overdue flag. Overdue loans get an empty
+    schedule. Cached loans are reused, the others are amortised together in a single
+    vectorised call.
+    """
+    if start_month is None:
+        start_month = _month_index(date.today())
+
+    keys = [_fingerprint(loan, start_month) for loan in loans]
+    schedules = [_schedule_cache.get(key) for key in keys]
+    missing = [i for i, schedule in enumerate(schedules) if schedule is None]
+
+    months_left = {i: remaining_months(loans[i], start_month) for i in missing}
+    for i in missing:
+        if not months_left[i]:
+            schedules[i] = {"emi": 0.0, "balance": np.zeros(0), "interest": np.zeros(0), "principal": np.zeros(0),
+                            "overdue": True}
+    missing = [i for i in missing if months_left[i]]
+
+    if missing:
+        months = np.array([months_left[i] for i in missing])
+        result = amortize(
+            [loans[i].amount or 0.0 for i in missing],
+            [loans[i].interest_rate or 0.0 for i in missing],
+            months,
+        )
+        for row, i in enumerate(missing):
+            n = months[row]
+            schedule = {
+                "emi": float(result["emi"][row]),
+                "balance": result["balance"][row, :n].copy(),
+                "interest": result["interest"][row, :n].copy(),
+                "principal": result["principal"][row, :n].copy(),
+                "overdue": False,
+            }
+            _schedule_cache.set(keys[i], schedule)
+            schedules[i] = schedule
+
+    return schedules
+
+
+def _stack(rows, horizon):
+    """Pad per loan arrays with zeros to a (N, horizon) matrix"""
+    matrix = np.zeros((len(rows), horizon))
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def get_loan_portfolio(user_id, start_month=None):
+    """
+    EMI, tenure and total interest of every loan of a user, and the month by month
+    outstanding balance, payment and interest of the whole portfolio
+    """
+    if start_month is None:
+        start_month = _month_index(date.today())
+
+    loans = Loan.query.filter(Loan.user_id == user_id).order_by(Loan.loan_id).all()
+    schedules = loan_schedules(loans, start_month)
+    horizon = max((len(s["balance"]) for s in schedules), default=0)
+
+    balance = _stack([s["balance"] for s in schedules], horizon)
+    interest = _stack([s["interest"] for s in schedules], horizon)
+    principal = _stack([s["principal"] for s in schedules], horizon)
+    payment = interest + principal
+
+    loan_rows = [
+        {
+            "id": loan.loan_id,
+            "lender": loan.lender,
+            "loan_category": loan.loan_category,
+            "amount": loan.amount,
+            "interest_rate": loan.interest_rate,
+            "months": len(s["balance"]),
+            "overdue": s["overdue"],
+            "emi": round(s["emi"], 2),
+            "total_interest": round(float(s["interest"].sum()), 2),
+            "total_payable": round(float(s["interest"].sum() + s["principal"].sum()), 2),
+        }
+        for loan, s in zip(loans, schedules)
+    ]
+
+    return {
+        "loans": loan_rows,
+        "total_interest": round(float(interest.sum()), 2),
+        "monthly": [
+            {"month": _month_label(start_month + k + 1), "balance": round(b, 2), "payment": round(p, 2), "interest": round(i, 2)}
+            for k, (b, p, i) in enumerate(zip(balance.sum(axis=0).tolist(), payment.sum(axis=0).tolist(),
+                                              interest.sum(axis=0).tolist()))
+        ],
+    }
+
+
+def get_loan_schedule(loan, start_month=None):
+    """Month by month schedule of a single loan"""
+    if start_month is None:
+        start_month = _month_index(date.today())
+
+    schedule = loan_schedules([loan], start_month)[0]
+    return {
+        "id": loan.loan_id,
+        "emi": round(schedule["emi"], 2),
+        "overdue": schedule["overdue"],
+        "schedule": [
+            {"month": _month_label(start_month + k + 1), "payment": round(p + i, 2), "principal": round(p, 2),
+             "interest": round(i, 2), "balance": round(b, 2)}
+            for k, (p, i, b) in enumerate(zip(schedule["principal"].tolist(), schedule["interest"].tolist(),
+                                              schedule["balance"].tolist()))
+        ],
+    }
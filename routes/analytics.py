@@ -0,0 +1,166 @@
+import math
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from .schema import Expense, db
+from .categories import category_registry
+
+ROLLING_WINDOWS = (3, 6, 12)
+ANOMALY_Z = 3.0
+# categories with fewer expenses than this are not scored
+ANOMALY_MIN_COUNT = 5
+MAX_ANOMALIES = 20
+# months used to fit the forecast trend, seasonality needs two full years
+FORECAST_HISTORY = 36
+SEASONAL_MIN_MONTHS = 24
+
+
+def _number(value):
+    """float for JSON, None for NaN/inf"""
+    if value is None:
+        return None
+    value = float(value)
+    return None if math.isnan(value) or math.isinf(value) else round(value, 2)
+
+
+def load_expense_frame(user_id):
+    """
+    All dated expenses of a user as one DataFrame (id, date, category, amount,
+    description, month), read in a single query
+    """
+    stmt = (
+        select(
+            Expense.expense_id.label("id"),
+            Expense.date,
+            Expense.category_id,
+            Expense.amount,
+            Expense.description,
+        )
+        .where(Expense.user_id == user_id, Expense.date.isnot(None), Expense.category_id.isnot(None))
+    )
+    frame = pd.read_sql(stmt, db.session.connection())
+    category_ids = frame.pop("category_id")
+    names = {category_id: category_registry.name_of(int(category_id)) for category_id in category_ids.unique()}
+    frame.insert(2, "category", category_ids.map(names))
+    frame["date"] = pd.to_datetime(frame["date"])
+    frame["month"] = frame["date"].dt.to_period("M")
+    return frame
+
+
+def monthly_by_category(frame):
+    """Month x category spend matrix, with empty months filled with 0"""
+    table = frame.pivot_table(index="month", columns="category", values="amount", aggfunc="sum", fill_value=0.0)
+    months = pd.period_range(table.index.min(), table.index.max(), freq="M")
+    return table.reindex(months, fill_value=0.0)
+
+
+def rolling_averages(totals, windows=ROLLING_WINDOWS):
+    """Rolling mean of the monthly totals for each window, NaN until the window is full"""
+    return pd.DataFrame({f"avg_{w}m": totals.rolling(w, min_periods=w).mean() for w in windows})
+
+
+def month_over_month(monthly):
+    """
+    Change of every category between the last two months, largest moves first
+    """
+    if len(monthly) < 2:
+        return []
+    current, previous = monthly.iloc[-1], monthly.iloc[-2]
+    delta = current - previous
+    pct = delta / previous.replace(0, np.nan) * 100
+    order = delta.abs().sort_values(ascending=False).index
+    return [
+        {
+            "category": category,
+            "current": _number(current[category]),
+            "previous": _number(previous[category]),
+            "delta": _number(delta[category]),
+            "delta_pct": _number(pct[category]),
+        }
+        for category in order if current[category] or previous[category]
+    ]
+
+
+def anomalies(frame, threshold=ANOMALY_Z, min_count=ANOMALY_MIN_COUNT, limit=MAX_ANOMALIES):
+    """
+    Expenses whose amount is more than `threshold` standard deviations away from
+    the mean of their category, most recent first
+    """
+    grouped = frame.groupby("category")["amount"]
+    mean = grouped.transform("mean")
+    std = grouped.transform(lambda amounts: amounts.std(ddof=0)).replace(0, np.nan)
+    z = (frame["amount"] - mean) / std
+
+    flagged = frame.assign(z=z, category_mean=mean)
+    flagged = flagged[(z.abs() >= threshold) & (grouped.transform("count") >= min_count)]
+    flagged = flagged.sort_values(["date", "id"], ascending=False).head(limit)
+    return [
+        {
+            "id": int(row.id),
+            "date": row.date.strftime("%Y-%m-%d"),
+            "category": row.category,
+            "description": row.description,
+            "amount": _number(row.amount),
+            "category_mean": _number(row.category_mean),
+            "z": _number(row.z),
+        }
+        for row in flagged.itertuples(index=False)
+    ]
+
+
+def forecast_next_month(totals, history=FORECAST_HISTORY):
+    """
+    Least squares trend over the last `history` months, plus the average residual of
+    the same calendar month when there are at least two years of data
+    """
+    recent = totals.iloc[-history:]
+    y = recent.to_numpy(dtype=float)
+    x = np.arange(len(y))
+    next_month = totals.index[-1] + 1
+
+    if len(y) < 2:
+        trend, fitted = y[-1], y
+    else:
+        slope, intercept = np.polyfit(x, y, 1)
+        trend, fitted = slope * len(y) + intercept, slope * x + intercept
+
+    seasonal = 0.0
+    if len(y) >= SEASONAL_MIN_MONTHS:
+        same_month = recent.index.month == next_month.month
+        seasonal = float((y - fitted)[same_month].mean())
+
+    return {
+        "month": str(next_month),
+        "amount": _number(max(trend + seasonal, 0.0)),
+        "trend": _number(trend),
+        "seasonal": _number(seasonal),
+        "method": "linear+seasonal" if len(y) >= SEASONAL_MIN_MONTHS else "linear",
+    }
+
+
+def get_expense_analytics(user_id):
+    """
+    Spending trends of a user computed in one pass over the ledger: monthly totals with
+    rolling averages, month over month changes per category, anomalous expenses and a
+    forecast of next month's spend. Returns JSON-serialisable data.
+    """
+    frame = load_expense_frame(user_id)
+    if frame.empty:
+        return {"monthly": [], "latest": None, "month_over_month": [], "anomalies": [], "forecast": None}
+
+    monthly = monthly_by_category(frame)
+    totals = monthly.sum(axis=1)
+    averages = rolling_averages(totals)
+
+    series = [
+        {"month": str(month), "total": _number(total), **{k: _number(v) for k, v in averages.loc[month].items()}}
+        for month, total in totals.items()
+    ]
+
+    return {
+        "monthly": series,
+        "latest": series[-1],
+        "month_over_month": month_over_month(monthly),
+        "anomalies": anomalies(frame),
+        "forecast": forecast_next_month(totals),
+    }
@@ -0,0 +1,174 @@
+from logger.log_utility import base_logger
+
+from .context import parse_dashboard_filters, build_ledger_criteria, get_cached_aggregates, next_page_url
+from .filters import get_ledger_page, get_ledger_summaries
+from .pagination import InvalidCursor, clamp_limit
+from .schema import Loan
+from .cache import dashboard_cache
+
+from flask_login import login_required, current_user
+from flask import Blueprint, request, jsonify
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+def _format_date(value):
+    return value.strftime("%Y-%m-%d") if value else None
+
+
+def _serialize_expense(e):
+    return {
+        "id": e.expense_id,
+        "date": _format_date(e.date),
+        "category": e.category.name if e.category else None,
+        "description": e.description,
+        "amount": e.amount,
+    }
+
+
+def _serialize_loan(l):
+    return {
+        "id": l.loan_id,
+        "lender": l.lender,
+        "amount": l.amount,
+        "interest_rate": l.interest_rate,
+        "due_date": _format_date(l.due_date),
+        "loan_category": l.loan_category,
+    }
+
+
+def _serialize_insurance(i):
+    return {
+        "id": i.insurance_id,
+        "provider": i.provider,
+        "policy_type": i.policy_type,
+        "premium": i.premium,
+        "renewal_date": _format_date(i.renewal_date),
+    }
+
+
+# API ledger name -> aggregates ledger name
+CHART_LEDGERS = {
+    "expenses": "expense",
+    "loans": "loan",
+    "insurances": "insurance",
+}
+
+SERIALIZERS = {
+    "expenses": _serialize_expense,
+    "loans": _serialize_loan,
+    "insurances": _serialize_insurance,
+}
+
+
+@bp.route("/<any(expenses, loans, insurances):ledger>")
+@login_required
+def list_ledger(ledger):
+    """
+    Keyset paginated listing of a ledger, newest first.
+    Accepts the dashboard filter parameters plus `after` (cursor) and `limit`.
+    """
+    base_logger.info(f"Listing {ledger} page")
+    try:
+        filters = parse_dashboard_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format."}), 400
+
+    criteria = build_ledger_criteria(current_user.user_id, filters)[ledger]
+    try:
+        rows, next_cursor = get_ledger_page(
+            ledger, criteria, request.args.get("after"), clamp_limit(request.args.get("limit"))
+        )
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+
+    serialize = SERIALIZERS[ledger]
+    return jsonify({
+        "rows": [serialize(row) for row in rows],
+        "next_cursor": next_cursor,
+        "next_url": next_page_url(ledger, next_cursor, request.args),
+        "has_more": next_cursor is not None,
+    })
+
+
+@bp.route("/summary")
+@login_required
+def summary():
+    """
+    KPI figures (count, total, min/max amount, date range) for every ledger,
+    computed in SQL without loading any rows. Accepts the dashboard filter parameters.
+    """
+    base_logger.info("Fetching ledger summary")
+    try:
+        filters = parse_dashboard_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format."}), 400
+
+    summaries = get_ledger_summaries(build_ledger_criteria(current_user.user_id, filters))
+    for figures in summaries.values():
+        figures["first_date"] = _format_date(figures["first_date"])
+        figures["last_date"] = _format_date(figures["last_date"])
+    return jsonify(summaries)
+
+
+@bp.route("/charts/<any(expenses, loans, insurances):ledger>")
+@login_required
+def charts(ledger):
+    """
+    Total and chart series of one ledger for the dashboard filter parameters.
+    Responses carry an ETag, unchanged series answer If-None-Match with 304.
+    """
+    base_logger.info(f"Fetching {ledger} chart series")
+    try:
+        filters = parse_dashboard_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format."}), 400
+
+    criteria = build_ledger_criteria(current_user.user_id, filters)
+    series = get_cached_aggregates(current_user.user_id, filters, criteria, ledgers=(CHART_LEDGERS[ledger],))
+
+    response = jsonify(series)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+@bp.route("/analytics")
+@login_required
+def analytics():
+    """
+    Spending trends of the whole expense ledger (rolling averages, month over month
+    changes, anomalies, forecast), cached until the user's next write.
+    """
+    # pandas is imported on first use, not at worker boot
+    from .analytics import get_expense_analytics
+
+    base_logger.info("Fetching expense analytics")
+    user_id = current_user.user_id
+    return jsonify(dashboard_cache.get_or_compute("analytics", user_id, {}, lambda: get_expense_analytics(user_id)))
+
+
+@bp.route("/loans/amortization")
+@login_required
+def loan_amortization():
+    """
+    EMI and total interest of every loan, plus the month by month outstanding
+    balance, payments and interest of the whole loan portfolio
+    """
+    from .amortization import get_loan_portfolio
+
+    base_logger.info("Fetching loan amortization")
+    return jsonify(get_loan_portfolio(current_user.user_id))
+
+
+@bp.route("/loans/<int:loan_id>/schedule")
+@login_required
+def loan_schedule(loan_id):
+    """Month by month EMI schedule of one loan"""
+    from .amortization import get_loan_schedule
+
+    loan = Loan.query.filter_by(loan_id=loan_id, user_id=current_user.user_id).first()
+    if loan is None:
+        return jsonify({"error": "Loan not found."}), 404
+    return jsonify(get_loan_schedule(loan))
@@ -1,9 +1,12 @@
-import random
-from email.message import EmailMessage
-from datetime import datetime, timedelta, timezone
+import time
 
-from app import base_logger
+from logger.log_utility import base_logger
 from .schema import User, db
+from .otp_store import otp_store, VERIFIED, INVALID, LOCKED
+from .identity import identity_cache
+from .mailer import mail_queue
+from .metrics import otp_email_duration
+from .otp_email import build_otp_email
 
 from flask_login import (login_user, 
                          logout_user, 
@@ -12,8 +15,7 @@ from flask import (Blueprint,
                    render_template, 
                    redirect, 
                    url_for,
-                   session, current_app, request)
-from smtplib import SMTP, SMTP_SSL, SMTPException
+                   session, request)
 
 
 bp = Blueprint("auth", __name__)
@@ -76,118 +78,42 @@ def _is_strong_password(pw: str) -> tuple[bool, str]:
 
 
 def _send_otp_via_email(to_addr: str, otp: str) -> bool:
-    base_logger.info(f"Sending otp {otp} to address {to_addr}")
+    base_logger.info(f"Sending otp to address {to_addr}")
     """
-    Send OTP to given address using current app mail config. Returns True on success.
+    Queue the OTP email to given address for background delivery. Returns True once queued.
     """
-    cfg = current_app.config
-    
-    # Determine which SMTP settings to use
-    domain = to_addr.split('@')[-1].lower()
-    provider_cfg = domain
-    
-    # Use provider-specific settings, with a fallback to global config for each value
-    mail_server = cfg.get('MAIL_SERVER')
-    mail_port = int(cfg.get('MAIL_PORT', 587)) 
-    mail_username = cfg.get('MAIL_USERNAME')
-    mail_password = cfg.get('MAIL_PASSWORD')
-    use_tls = cfg.get('MAIL_USE_TLS', True) 
-    use_ssl = cfg.get('MAIL_USE_SSL', False) 
-    
-
-    html_content = render_template('emails/otp_email.html',
-        app_name='Finance Management',
-        greeting_message='Verify otp to Login',
-        otp_digits=list(otp),
-        otp_code=otp,
-        tagline='Secure your finances',
-        expiry_time=5,
-        security_tips=[
-            'Never share this code with anyone',
-            'We will never ask for this code via phone or email',
-            'If you didn\'t request this, please ignore this email'
-        ],
-        call_to_action='Enter this code in your Finance Management app to continue',
-        team_name='Finance Management Team',
-        footer_message='This is an automated message. Please do not reply to this email.'
-    )
-    
-    # Plain text fallback
-    plain_text = f"""
-        Finance Management - Verification Required
-
-        Your verification code is: {otp}
-
-        This code will expire in 5 minutes.
-        Keep this code confidential and do not share it with anyone.
-
-        If you didn't request this code, please ignore this email.
-
-        Best regards,
-        Finance Management Team
-    """
-
-    msg = EmailMessage()
-    msg['Subject'] = '🔐 Finance Management - Your Verification Code'
-    msg['From'] = mail_username
-    msg['To'] = to_addr
-    
-    # Set plain text content first
-    msg.set_content(plain_text.strip())
-    
-    # Add HTML content as alternative
-    msg.add_alternative(html_content.strip(), subtype='html')
-
-    # Use different approaches based on SSL/TLS configuration
-    if use_ssl:
-        with SMTP_SSL(mail_server, mail_port, timeout=30) as smtp:
-            smtp.ehlo()
-            if mail_username and mail_password:
-                smtp.login(mail_username, mail_password)
-            smtp.send_message(msg)
-    else:
-        with SMTP(mail_server, mail_port, timeout=30) as smtp:
-            smtp.ehlo()
-            if use_tls:
-                smtp.starttls()
-                smtp.ehlo()  # Call ehlo() again after starttls()
-            
-            if mail_username and mail_password:
-                smtp.login(mail_username, mail_password)
-            smtp.send_message(msg)
+    # Rendered and encoded once per process, only the code is spliced in per send
+    msg = build_otp_email(to_addr, otp)
 
-    return True
-
-def _get_user_from_session_otp():
-    """Retrieves the user associated with the OTP verification session."""
-    base_logger.info(f"Getting otp from user")
-    user_id = session.get('otp_user_id')
-    return User.query.get(int(user_id)) if user_id else None
+    # Delivery happens on the mail workers, the request does not wait for SMTP
+    started = time.perf_counter()
+    try:
+        queued = mail_queue.enqueue(msg)
+    except Exception:
+        otp_email_duration.observe(time.perf_counter() - started, result="error")
+        raise
+    result = ("sent" if mail_queue.synchronous else "queued") if queued else "dropped"
+    otp_email_duration.observe(time.perf_counter() - started, result=result)
+    return queued
 
 # --- OTP-based password reset helpers & routes ---
-def _start_reset_otp_for_user(user, minutes_valid=10):
-    """Start a reset OTP flow for given user: stores otp and expiry in session and sends email."""
-    otp = str(random.randint(100000, 999999)).zfill(6)
-    expires_at = (datetime.now(timezone.utc) + timedelta(minutes=minutes_valid)).isoformat()
-    session['reset_otp'] = otp
-    session['reset_otp_expires_at'] = expires_at
-    session['reset_otp_user_id'] = user.user_id
-    session['reset_otp_attempts'] = 0
-    base_logger.info(f"Started password reset OTP for user {user.email}; expires at {expires_at}")
+def _start_reset_otp_for_user(user):
+    """Start a reset OTP flow for given user: keeps the otp server-side, the session only its token, and sends email."""
+    token, otp = otp_store.start("reset", user)
+    session['reset_token'] = token
+    base_logger.info(f"Started password reset OTP for user {user.email}")
     try:
         _send_otp_via_email(user.email, otp)
     except Exception:
         base_logger.exception("Failed to send password reset OTP email")
-        # still keep session so user can retry; return False if you need special handling
+        # still keep the entry so user can retry
     return True
 
-def _get_user_from_session_reset_otp():
-    user_id = session.get('reset_otp_user_id')
-    return User.query.get(int(user_id)) if user_id else None
+def _get_reset_otp():
+    return otp_store.get("reset", session.get('reset_token'))
 
 def _clear_reset_session():
-    for k in ('reset_otp', 'reset_otp_expires_at', 'reset_otp_user_id', 'reset_otp_attempts', 'reset_verified'):
-        session.pop(k, None)
+    otp_store.clear("reset", session.pop('reset_token', None))
 
 @bp.route("/forgot-password", methods=["GET", "POST"])
 def forgot_password():
@@ -201,14 +127,8 @@ def forgot_password():
         if not user:
             return render_template("forgot_password.html", info="If this email is registered, an OTP has been sent.")
 
-        otp = str(random.randint(100000, 999999)).zfill(6)
-        expires_at = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
-
-        session["reset_otp"] = otp
-        session["reset_otp_expires"] = expires_at
-        session["reset_user_id"] = user.user_id
-
-        _send_otp_via_email(user.email, otp)
+        _clear_reset_session()
+        _start_reset_otp_for_user(user)
 
         return redirect(url_for("auth.verify_reset_otp"))
 
@@ -222,44 +142,34 @@ def verify_reset_otp():
     """
     if request.method == "POST":
         action = request.form.get("action")
+        token = session.get("reset_token")
 
         if action == "resend":
-            user_id = session.get("reset_user_id")
-            if not user_id:
+            resent = otp_store.resend("reset", token)
+            if not resent:
                 return redirect(url_for("auth.forgot_password"))
 
-            user = User.query.get(user_id)
-            otp = str(random.randint(100000, 999999)).zfill(6)
-            session["reset_otp"] = otp
-            session["reset_otp_expires"] = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
-            _send_otp_via_email(user.email, otp)
+            otp, record = resent
+            _send_otp_via_email(record["email"], otp)
 
             return render_template("verify_reset_otp.html", info="A new OTP has been sent to your email.")
 
         submitted = request.form.get("otp", "").strip()
-        stored = session.get("reset_otp")
-        expires_str = session.get("reset_otp_expires")
-        user_id = session.get("reset_user_id")
-
-        if not all([submitted, stored, expires_str, user_id]):
+        if not submitted or not token:
             return redirect(url_for("auth.forgot_password"))
 
-        try:
-            expires_dt = datetime.fromisoformat(expires_str)
-        except (ValueError, TypeError):
-            expires_dt = datetime.now(timezone.utc) - timedelta(seconds=1)
-
-        if datetime.now(timezone.utc) > expires_dt:
-            session.pop("reset_otp", None)
-            session.pop("reset_otp_expires", None)
-            session.pop("reset_user_id", None)
-            return render_template("verify_reset_otp.html", error="OTP expired. Please try again.")
+        status, _ = otp_store.verify("reset", token, submitted)
 
-        if submitted == stored:
+        if status == VERIFIED:
             return redirect(url_for("auth.reset_password"))
-        else:
+        if status == INVALID:
             return render_template("verify_reset_otp.html", error="Invalid OTP. Please try again.")
 
+        session.pop("reset_token", None)
+        if status == LOCKED:
+            return render_template("verify_reset_otp.html", error="Too many attempts. Please request a new OTP.")
+        return render_template("verify_reset_otp.html", error="OTP expired. Please try again.")
+
     return render_template("verify_reset_otp.html")
 
 
@@ -269,12 +179,9 @@ def reset_password():
     Provide new password, and confirm it to make sure
     the password is not forgotten again by us
     """
-    user_id = session.get("reset_user_id")
-    if not user_id:
-        return redirect(url_for("auth.forgot_password"))
-
-    user = User.query.get(user_id)
-    if not user:
+    # only a reset flow whose OTP was verified may set a new password
+    record = _get_reset_otp()
+    if not record or not record["verified"]:
         return redirect(url_for("auth.forgot_password"))
 
     if request.method == "POST":
@@ -288,17 +195,21 @@ def reset_password():
         if not ok:
             return render_template("reset_password.html", error=reason)
 
+        user = db.session.get(User, record["user_id"])
+        if not user:
+            _clear_reset_session()
+            return redirect(url_for("auth.forgot_password"))
+
         user.set_password(password)
         try:
             db.session.commit()
         except Exception:
             db.session.rollback()
             return render_template("reset_password.html", error="Something went wrong. Please try again.")
+        identity_cache.invalidate(user.user_id)
 
-        # Clear reset session keys
-        session.pop("reset_otp", None)
-        session.pop("reset_otp_expires", None)
-        session.pop("reset_user_id", None)
+        # The reset OTP is single use
+        _clear_reset_session()
 
         return redirect(url_for("auth.login"))
 
@@ -357,11 +268,15 @@ def login():
 
         # validate credentials first
         if user and user.check_password(password):
-            otp = str(random.randint(100000, 999999)).zfill(6)
-            expires_at = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
-            session['otp'] = otp
-            session['otp_expires_at'] = expires_at
-            session['otp_user_id'] = user.user_id
+            # persist a rehash at the configured bcrypt cost, if check_password made one
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+
+            otp_store.clear("login", session.pop('otp_token', None))
+            token, otp = otp_store.start("login", user)
+            session['otp_token'] = token
             session['next'] = request.args.get('next')
 
             sent = _send_otp_via_email(user.email, otp)
@@ -382,55 +297,48 @@ def verify():
         base_logger.info(f"Starting otp validation phase")
         action = request.form.get('action')
 
+        token = session.get('otp_token')
+
         if action == 'resend':
-            user = _get_user_from_session_otp()
-            if not user:
+            resent = otp_store.resend("login", token)
+            if not resent:
                 return redirect(url_for('auth.login'))
 
-            otp = str(random.randint(100000, 999999)).zfill(6)
-            session['otp'] = otp
-            session['otp_expires_at'] = (datetime.now(timezone.utc) + timedelta(minutes=5)).isoformat()
-            sent = _send_otp_via_email(user.email, otp)
+            otp, record = resent
+            sent = _send_otp_via_email(record["email"], otp)
             return redirect(url_for('auth.verify'))
 
 
         submitted = request.form.get('otp', '').strip()
-        stored = session.get('otp')
-        expires_str = session.get('otp_expires_at')
-        user = _get_user_from_session_otp()
-
-        if not all([submitted, stored, expires_str, user]):
+        if not submitted or not token:
             return redirect(url_for('auth.login'))
 
-        try:
-            expires_dt = datetime.fromisoformat(expires_str)
-        except (ValueError, TypeError):
-            expires_dt = datetime.now(timezone.utc) - timedelta(seconds=1) # Expired
-
-        # clear session OTP info
-        if datetime.now(timezone.utc) > expires_dt:
-            session.pop('otp', None)
-            session.pop('otp_expires_at', None)
-            session.pop('otp_user_id', None)
-            return redirect(url_for('auth.login'))
+        status, record = otp_store.verify("login", token, submitted)
 
-        if submitted == stored:
+        if status == VERIFIED:
             # success - log user in
+            user = db.session.get(User, record["user_id"])
+            if not user:
+                return redirect(url_for('auth.login'))
             # mark user verified and persist; always log the user in afterwards
-            user.is_verified = True
-            try:
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
+            if not record["is_verified"]:
+                user.is_verified = True
+                try:
+                    db.session.commit()
+                except Exception:
+                    db.session.rollback()
+                identity_cache.invalidate(user.user_id)
             login_user(user)
-            # clear OTP session keys
-            session.pop('otp', None)
-            session.pop('otp_expires_at', None)
-            session.pop('otp_user_id', None)
+            # the OTP is single use
+            otp_store.clear("login", session.pop('otp_token', None))
             next_page = session.pop('next', None)
             return redirect(next_page or url_for('dashboard.dashboard'))
-        else:
+        elif status == INVALID:
             return redirect(url_for('auth.verify'))
+        else:
+            # expired, or out of attempts
+            session.pop('otp_token', None)
+            return redirect(url_for('auth.login'))
 
     # GET
     return render_template('verify.html')
@@ -0,0 +1,333 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from logger.log_utility import base_logger
+
+
+class CacheUnavailable(Exception):
+    """Raised by a backend when the cache server cannot be reached."""
+
+
+class MemoryBackend:
+    """
+    In-process LRU map with per-entry TTL. Only shared by the threads of one
+    worker process, use RedisBackend when running several workers.
+
+    With max_bytes (and sizeof, giving an entry's size in bytes) the least recently
+    used entries are also evicted once the sizes add up to more than max_bytes.
+    sizeof only sees values passed to set()/add(), incr() counters count as 0 bytes.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof if max_bytes else None
+        self.bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pop(self, key):
+        # entries are (expires_at, value, size)
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._pop(key)
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def _store(self, key, value, ttl):
+        self._pop(key)
+        size = self._sizeof(value) if self._sizeof else 0
+        self._data[key] = (time.monotonic() + ttl if ttl else None, value, size)
+        self.bytes += size
+        while len(self._data) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+            self._pop(next(iter(self._data)))
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key, value, ttl=None):
+        """Set the entry only if it is missing (or expired); True when it was set"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def incr(self, key, ttl=None):
+        """Atomically add 1 to an integer entry (0 when missing); a new entry expires after ttl."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+                entry = (time.monotonic() + ttl if ttl else None, 0, 0)
+            value = entry[1] + 1
+            self._pop(key)
+            self._data[key] = (entry[0], value, 0)
+            return value
+
+    def delete(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+
+class RedisBackend:
+    """
+    Minimal RESP2 client (GET/SET EX/SET NX/INCR/DEL) for Redis or any server speaking the
+    Redis protocol. Values are stored as JSON; eviction is left to the server's
+    maxmemory policy, entries expire through SET ... EX.
+
+    Commands are re-sent once on a broken connection, except INCR: the server may
+    have applied it before the reply was lost.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", timeout=0.5):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self._reader = self._sock.makefile("rb")
+        if self.password:
+            self._send("AUTH", self.password)
+        if self.db:
+            self._send("SELECT", self.db)
+
+    def _close(self):
+        for handle in (self._reader, self._sock):
+            try:
+                if handle is not None:
+                    handle.close()
+            except OSError:
+                pass
+        self._sock = self._reader = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        return b"".join(parts)
+
+    def _send(self, *args):
+        self._sock.sendall(self._encode(args))
+        return self._read_reply()
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by cache server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise CacheUnavailable(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [self._read_reply() for _ in range(length)]
+        raise CacheUnavailable(f"Unexpected reply from cache server: {line!r}")
+
+    def _command(self, *args, retry=True):
+        with self._lock:
+            for attempt in (1, 2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(*args)
+                except OSError as e:
+                    self._close()
+                    if attempt == 2 or not retry:
+                        raise CacheUnavailable(str(e)) from e
+
+    def _transaction(self, *commands):
+        """MULTI ... EXEC in one round trip, returns the EXEC replies; never re-sent"""
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall(b"".join(self._encode(args) for args in [("MULTI",), *commands, ("EXEC",)]))
+                # +OK for MULTI, +QUEUED per command
+                for _ in range(len(commands) + 1):
+                    self._read_reply()
+                return self._read_reply()
+            except (OSError, CacheUnavailable) as e:
+                # replies may be left unread on the connection
+                self._close()
+                if isinstance(e, CacheUnavailable):
+                    raise
+                raise CacheUnavailable(str(e)) from e
+
+    def get(self, key):
+        raw = self._command("GET", key)
+        return None if raw is None else json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        payload = json.dumps(value)
+        if ttl:
+            self._command("SET", key, payload, "EX", int(ttl))
+        else:
+            self._command("SET", key, payload)
+
+    def add(self, key, value, ttl=None):
+        """SET ... NX: True when the key was missing and is now set"""
+        args = ["SET", key, json.dumps(value)] + (["EX", int(ttl)] if ttl else []) + ["NX"]
+        return self._command(*args) is not None
+
+    def incr(self, key, ttl=None):
+        """INCR; a counter created here gets its expiry in the same transaction"""
+        if not ttl:
+            return self._command("INCR", key, retry=False)
+        return self._transaction(("SET", key, 0, "EX", int(ttl), "NX"), ("INCR", key))[1]
+
+    def delete(self, key):
+        self._command("DEL", key)
+
+
+class DashboardCache:
+    """
+    Caches JSON-serialisable dashboard data per (user, normalised filters, data version).
+
+    Each user has a version token; bump_version() replaces it after a write, so
+    every entry computed from older data stops being addressed and ages out.
+    If a version token is evicted, a fresh one is generated, so stale entries are
+    never served.
+    """
+
+    def __init__(self, backend=None, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        cfg = app.config
+        kind = cfg.get("DASHBOARD_CACHE_BACKEND", "memory")
+        self.ttl = cfg.get("DASHBOARD_CACHE_TTL", 300)
+        if kind == "redis":
+            self.backend = RedisBackend(cfg.get("DASHBOARD_CACHE_URL", "redis://localhost:6379/0"))
+        elif kind == "memory":
+            self.backend = MemoryBackend(cfg.get("DASHBOARD_CACHE_MAX_ENTRIES", 1024))
+        else:
+            self.backend = None
+        base_logger.info(f"Dashboard cache backend: {kind}")
+
+    @staticmethod
+    def _version_key(user_id):
+        return f"dashboard:version:{user_id}"
+
+    @staticmethod
+    def normalize_filters(filters):
+        """Stable digest of the filter values: list order and empty values do not matter."""
+        normalized = {}
+        for name, value in filters.items():
+            if isinstance(value, (list, tuple)):
+                value = sorted(value)
+            if value:
+                normalized[name] = value
+        payload = json.dumps(normalized, sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _version(self, user_id):
+        key = self._version_key(user_id)
+        version = self.backend.get(key)
+        if version is None:
+            # only create the token if no other worker (or a bump) got there first, then use whichever won
+            version = uuid.uuid4().hex
+            if not self.backend.add(key, version):
+                version = self.backend.get(key) or version
+        return version
+
+    def bump_version(self, user_id):
+        """Invalidate every cached entry of this user."""
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(self._version_key(user_id), uuid.uuid4().hex)
+        except CacheUnavailable:
+            self._count("errors")
+            base_logger.exception(f"Could not bump dashboard cache version for user {user_id}")
+
+    def get_or_compute(self, namespace, user_id, filters, compute):
+        """
+        Return the cached value for (namespace, user, filters, version) or compute and store it.
+        Cache server failures fall back to computing the value.
+        """
+        if self.backend is None:
+            return compute()
+
+        try:
+            key = f"dashboard:{namespace}:{user_id}:{self._version(user_id)}:{self.normalize_filters(filters)}"
+            value = self.backend.get(key)
+        except CacheUnavailable:
+            self._count("errors")
+            base_logger.exception("Dashboard cache unavailable, computing directly")
+            return compute()
+
+        if value is not None:
+            self._count("hits")
+            return value
+
+        self._count("misses")
+        value = compute()
+        try:
+            self.backend.set(key, value, self.ttl)
+        except CacheUnavailable:
+            self._count("errors")
+        return value
+
+    def stats(self):
+        with self._lock:
+            hits, misses, errors = self.hits, self.misses, self.errors
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "errors": errors,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+dashboard_cache = DashboardCache()
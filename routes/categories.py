@@ -0,0 +1,92 @@
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import select
+
+from .schema import Category, db
+
+CategoryEntry = namedtuple("CategoryEntry", ["category_id", "name"])
+
+# seconds between reloads, so a category added by another process shows up
+REFRESH_SECONDS = 300
+# an unknown name or id reloads early, at most this often
+MISS_REFRESH_SECONDS = 5
+
+
+class CategoryRegistry:
+    """
+    Process-wide copy of the categories table (a handful of rows that almost never
+    change): name <-> id maps and the name-ordered list for dropdowns. Lets the
+    expense filters compare category_id against ids instead of joining categories,
+    and the chart queries group by id and label the buckets here.
+
+    Loaded on first use inside an app context; invalidate() after writing categories.
+    Readers always get a complete snapshot, a reload swaps in a new one under the lock.
+    """
+
+    def __init__(self, refresh_seconds=REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._loaded_generation = -1
+        self.loads = 0
+
+    def _load(self):
+        with self._lock:
+            generation = self._generation
+        rows = db.session.execute(select(Category.category_id, Category.name).order_by(Category.name)).all()
+        entries = [CategoryEntry(category_id, name) for category_id, name in rows]
+        snapshot = (
+            entries,
+            {entry.name: entry.category_id for entry in entries},
+            {entry.category_id: entry.name for entry in entries},
+        )
+        with self._lock:
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            # an invalidate() that came in while querying still forces the next reload
+            self._loaded_generation = generation
+            self.loads += 1
+        return snapshot
+
+    def _current(self, missing=False):
+        """(entries, id by name, name by id), reloaded when stale or old"""
+        with self._lock:
+            snapshot, stale = self._snapshot, self._loaded_generation != self._generation
+            age = time.monotonic() - self._loaded_at
+        if snapshot is None or stale or age > self.refresh_seconds or (missing and age > MISS_REFRESH_SECONDS):
+            snapshot = self._load()
+        return snapshot
+
+    def invalidate(self):
+        """Reload on next use; until then readers keep the previous snapshot"""
+        with self._lock:
+            self._generation += 1
+
+    def all(self):
+        """(category_id, name) entries ordered by name"""
+        return self._current()[0]
+
+    def ids_for(self, names):
+        """Ids of the given category names, unknown names are left out"""
+        by_name = self._current()[1]
+        if any(name not in by_name for name in names):
+            by_name = self._current(missing=True)[1]
+        return [by_name[name] for name in names if name in by_name]
+
+    def name_of(self, category_id):
+        """Name of a category id; an id missing from the table gets "Category <id>" so labels stay sortable"""
+        by_id = self._current()[2]
+        if category_id not in by_id:
+            by_id = self._current(missing=True)[2]
+        return by_id.get(category_id, f"Category {category_id}")
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {"categories": len(snapshot[0]) if snapshot else 0, "loads": self.loads}
+
+
+category_registry = CategoryRegistry()
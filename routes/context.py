@@ -1,8 +1,11 @@
 from datetime import datetime
-from collections import defaultdict
-from sqlalchemy import extract, func
-from .schema import Expense, Loan, Insurance, Category
-from .filters import get_filtered_expenses, get_filtered_loans, get_filtered_insurances
+from flask import url_for
+from .categories import category_registry
+from .filters import expense_filters, loan_filters, insurance_filters, get_ledger_page
+from .aggregates import get_dashboard_aggregates
+from .cache import dashboard_cache
+from .rollups import (rollups_cover, expense_rollup_filters,
+                      loan_rollup_filters, insurance_rollup_filters)
 
 providers = [
     "LIC", "HDFC Ergo", "ICICI Lombard", "SBI Life", "Max Bupa",
@@ -49,60 +52,143 @@ DEFAULT_CATEGORIES = [
     "House Maintenance"
 ]
 
-def get_dashboard_context(user_id, args):
-    # Parse filter parameters
-    selected_expense_categories = args.getlist("expense_category") or []
-    selected_insurance_providers = args.getlist("insurance_provider") or []
-    selected_insurance_types = args.getlist("insurance_type") or []
-    selected_loan_lenders = args.getlist("loan_lender") or []
-    selected_loan_categories = args.getlist("loan_category") or []
+# filter values the aggregates of each ledger depend on
+LEDGER_FILTERS = {
+    "expense": ["selected_expense_categories", "start_date_str", "end_date_str"],
+    "loan": ["selected_loan_lenders", "selected_loan_categories", "start_date_str", "end_date_str"],
+    "insurance": ["selected_insurance_providers", "selected_insurance_types", "start_date_str", "end_date_str"],
+}
+
+
+def next_page_url(ledger, cursor, args):
+    """API url of the page after `cursor`, carrying the current filters along"""
+    if not cursor:
+        return None
+    params = args.to_dict(flat=False)
+    params.pop("after", None)
+    return url_for("api.list_ledger", ledger=ledger, after=cursor, **params)
 
+
+def parse_dashboard_filters(args):
+    """
+    Parse the dashboard filter query string shared by the page and the JSON API
+    """
     start_date_str = args.get("start_date")
     end_date_str = args.get("end_date")
-    start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else None
-    end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else None
 
-    # Get data using helpers
-    expenses, total_expenses, expense_chart_data, category_chart_data = get_filtered_expenses(
-        user_id, selected_expense_categories, start_date, end_date
-    )
+    return {
+        "selected_expense_categories": args.getlist("expense_category") or [],
+        "selected_insurance_providers": args.getlist("insurance_provider") or [],
+        "selected_insurance_types": args.getlist("insurance_type") or [],
+        "selected_loan_lenders": args.getlist("loan_lender") or [],
+        "selected_loan_categories": args.getlist("loan_category") or [],
+        "start_date_str": start_date_str,
+        "end_date_str": end_date_str,
+        "start_date": datetime.strptime(start_date_str, "%Y-%m-%d").date() if start_date_str else None,
+        "end_date": datetime.strptime(end_date_str, "%Y-%m-%d").date() if end_date_str else None,
+    }
+
+
+def build_ledger_criteria(user_id, filters):
+    """
+    WHERE criteria for every ledger, keyed by ledger name
+    """
+    return {
+        "expenses": expense_filters(
+            user_id, filters["selected_expense_categories"], filters["start_date"], filters["end_date"]
+        ),
+        "loans": loan_filters(
+            user_id, filters["selected_loan_lenders"], filters["selected_loan_categories"],
+            filters["start_date"], filters["end_date"]
+        ),
+        "insurances": insurance_filters(
+            user_id, filters["selected_insurance_providers"], filters["selected_insurance_types"],
+            filters["start_date"], filters["end_date"]
+        ),
+    }
 
-    loans, total_loans, loan_chart_data = get_filtered_loans(
-        user_id, selected_loan_lenders, selected_loan_categories, start_date, end_date
-    )
 
-    insurances, total_premium, insurance_chart_data = get_filtered_insurances(
-        user_id, selected_insurance_providers, selected_insurance_types, start_date, end_date
+def build_rollup_criteria(user_id, filters):
+    """
+    WHERE criteria on the monthly rollup tables, or None when the date range
+    does not align to month boundaries and the raw ledgers must be used
+    """
+    if not rollups_cover(filters["start_date"], filters["end_date"]):
+        return None
+
+    return {
+        "expenses": expense_rollup_filters(
+            user_id, filters["selected_expense_categories"], filters["start_date"], filters["end_date"]
+        ),
+        "loans": loan_rollup_filters(
+            user_id, filters["selected_loan_lenders"], filters["selected_loan_categories"],
+            filters["start_date"], filters["end_date"]
+        ),
+        "insurances": insurance_rollup_filters(
+            user_id, filters["selected_insurance_providers"], filters["selected_insurance_types"],
+            filters["start_date"], filters["end_date"]
+        ),
+    }
+
+
+def get_cached_aggregates(user_id, filters, criteria, ledgers=("expense", "loan", "insurance")):
+    """
+    get_dashboard_aggregates for the given ledgers, cached until the user's next write.
+    The cache key only includes the filters those ledgers depend on.
+    """
+    relevant = {name: filters[name] for ledger in ledgers for name in LEDGER_FILTERS[ledger]}
+    return dashboard_cache.get_or_compute(
+        "aggregates:" + ",".join(ledgers), user_id, relevant,
+        lambda: get_dashboard_aggregates(
+            criteria["expenses"], criteria["loans"], criteria["insurances"],
+            build_rollup_criteria(user_id, filters), ledgers,
+        ),
     )
 
-    # Query categories for dropdown
-    categories = Category.query.order_by(Category.name.asc()).all()
+
+def get_dashboard_context(user_id, args):
+    filters = parse_dashboard_filters(args)
+    criteria = build_ledger_criteria(user_id, filters)
+
+    # Only the first page of each listing is rendered, the tables fetch the rest from /api
+    expenses, expense_next_cursor = get_ledger_page("expenses", criteria["expenses"])
+    loans, loan_next_cursor = get_ledger_page("loans", criteria["loans"])
+    insurances, insurance_next_cursor = get_ledger_page("insurances", criteria["insurances"])
+
+    # Totals and chart series for all three ledgers in one round trip
+    aggregates = get_cached_aggregates(user_id, filters, criteria)
+
+    # Categories for dropdown, from the in-process registry
+    categories = category_registry.all()
 
     # Build context dict
     context = {
-        "total_expenses": total_expenses,
-        "total_loans": total_loans,
-        "total_premium": total_premium,
+        "total_expenses": aggregates["total_expenses"],
+        "total_loans": aggregates["total_loans"],
+        "total_premium": aggregates["total_premium"],
         "expenses": expenses,
         "loans": loans,
         "insurances": insurances,
+        "expense_next_url": next_page_url("expenses", expense_next_cursor, args),
+        "loan_next_url": next_page_url("loans", loan_next_cursor, args),
+        "insurance_next_url": next_page_url("insurances", insurance_next_cursor, args),
         "categories": categories,
         "lenders": LENDERS,
         "providers": providers,
         "POLICY_TYPES": POLICY_TYPES,
         "loan_categories": LOAN_CATEGORIES,
         "DEFAULT_CATEGORIES": DEFAULT_CATEGORIES,
-        "selected_expense_categories": selected_expense_categories,
-        "selected_loan_lenders": selected_loan_lenders,
-        "selected_loan_categories": selected_loan_categories,
-        "selected_insurance_providers": selected_insurance_providers,
-        "selected_insurance_types": selected_insurance_types,
-        "start_date": start_date_str,
-        "end_date": end_date_str,
-        "expense_chart_data": expense_chart_data,
-        "loan_chart_data": loan_chart_data,
-        "insurance_chart_data": insurance_chart_data,
-        "category_chart_data": category_chart_data,
+        "selected_expense_categories": filters["selected_expense_categories"],
+        "selected_loan_lenders": filters["selected_loan_lenders"],
+        "selected_loan_categories": filters["selected_loan_categories"],
+        "selected_insurance_providers": filters["selected_insurance_providers"],
+        "selected_insurance_types": filters["selected_insurance_types"],
+        "start_date": filters["start_date_str"],
+        "end_date": filters["end_date_str"],
+        "expense_chart_data": aggregates["expense_chart_data"],
+        "loan_chart_data": aggregates["loan_chart_data"],
+        "insurance_chart_data": aggregates["insurance_chart_data"],
+        "category_chart_data": aggregates["category_chart_data"],
     }
 
     return context
\ No newline at end of file
@@ -1,13 +1,19 @@
+import csv
+import io
 import random
-from app import base_logger
+from logger.log_utility import base_logger
 from datetime import datetime
 
 from .context import get_dashboard_context
+from .rollups import record_in_rollups
+from .cache import dashboard_cache
+from .importer import import_expenses, parse_statement, statement_format
 from .schema import Expense, Loan, Insurance, Category, db
 
 from sqlalchemy import extract, func
 from flask_login import login_required, current_user
-from flask import Blueprint, render_template, request, redirect, url_for
+from flask import Blueprint, flash, render_template, request, redirect, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
 
 bp = Blueprint("dashboard", __name__)
 
@@ -16,9 +22,14 @@ def _add_item_to_db(item):
     base_logger.info(f"Adding {item} to database")
     try:
         db.session.add(item)
+        # flush first so column defaults (e.g. Expense.date) are set before bucketing
+        db.session.flush()
+        record_in_rollups(item)
         db.session.commit()
     except Exception as e:
         db.session.rollback()
+        return
+    dashboard_cache.bump_version(item.user_id)
 
 @bp.route("/")
 def home():
@@ -56,6 +67,57 @@ def add_expense():
     return redirect(url_for("dashboard.dashboard"))
 
 
+@bp.route("/expenses/import", methods=["POST"])
+@login_required
+def import_statement():
+    # parsed and loaded inside the request, so it has to finish within the worker timeout:
+    # MAX_CONTENT_LENGTH (IMPORT_MAX_BYTES) caps the upload, chunked ones included, and
+    # larger statements go through `python -m seeders.import_statement`
+    try:
+        upload = request.files.get("statement")
+    except RequestEntityTooLarge:
+        base_logger.error(f"Rejected statement upload of {request.content_length} bytes")
+        flash("The statement is too large to import here, split it or ask for a bulk import.", "error")
+        return redirect(url_for("dashboard.dashboard"))
+    if not upload or not upload.filename:
+        flash("Choose a statement file to import.", "error")
+        return redirect(url_for("dashboard.dashboard"))
+
+    fmt = statement_format(upload.filename)
+    user_id = current_user.user_id
+    base_logger.info(f"Importing {fmt} statement {upload.filename} for user {user_id}")
+
+    # werkzeug spools large uploads to disk, the parser reads the file in a stream
+    stream = io.TextIOWrapper(upload.stream, encoding="utf-8-sig", errors="replace", newline="")
+    # chunks are committed as they go, a failure can come after some of them
+    committed = {"inserted": 0}
+
+    def progress(s):
+        committed["inserted"] = s["inserted"]
+        base_logger.info(f"Import progress: {s['read']} lines read, {s['inserted']} inserted")
+
+    try:
+        with db.engine.connect() as conn:
+            stats = import_expenses(conn, user_id, parse_statement(stream, fmt), sign="negative", progress=progress)
+    except (ValueError, csv.Error) as e:
+        base_logger.error(f"Could not import {upload.filename}: {e}")
+        flash(f"Could not import {upload.filename}: {e}"
+              + (f" ({committed['inserted']} expenses were imported before the error)" if committed["inserted"] else ""),
+              "error")
+    else:
+        base_logger.info(f"Imported {upload.filename}: {stats['inserted']} inserted, {stats['duplicates']} duplicates, "
+                         f"{stats['skipped']} skipped, {stats['invalid']} invalid")
+        flash(f"Imported {stats['inserted']} expenses from {upload.filename}: {stats['duplicates']} duplicates, "
+              f"{stats['skipped']} lines that are not expenses, {stats['invalid']} invalid lines.",
+              "warning" if stats["invalid"] else "success")
+        for error in stats["errors"]:
+            flash(error, "warning")
+
+    if committed["inserted"]:
+        dashboard_cache.bump_version(user_id)
+    return redirect(url_for("dashboard.dashboard"))
+
+
 @bp.route("/loans/add", methods=["POST"])
 @login_required
 def add_loan():
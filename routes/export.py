@@ -0,0 +1,173 @@
+import csv
+import io
+from logger.log_utility import base_logger
+
+from .context import parse_dashboard_filters, build_ledger_criteria
+from .schema import Expense, Loan, Insurance, Category, db
+
+from sqlalchemy import select
+from flask_login import login_required, current_user
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+
+bp = Blueprint("export", __name__, url_prefix="/export")
+
+# rows fetched per round trip from the server side cursor, also the parquet row group size
+EXPORT_BATCH_SIZE = 5000
+
+# ledger -> [(column name, expression, parquet type)], same fields as the /api listings
+EXPORT_COLUMNS = {
+    "expenses": [
+        ("id", Expense.expense_id, "int64"),
+        ("date", Expense.date, "timestamp"),
+        ("category", Category.name, "string"),
+        ("description", Expense.description, "string"),
+        ("amount", Expense.amount, "float64"),
+    ],
+    "loans": [
+        ("id", Loan.loan_id, "int64"),
+        ("lender", Loan.lender, "string"),
+        ("amount", Loan.amount, "float64"),
+        ("interest_rate", Loan.interest_rate, "float64"),
+        ("due_date", Loan.due_date, "date32"),
+        ("loan_category", Loan.loan_category, "string"),
+    ],
+    "insurances": [
+        ("id", Insurance.insurance_id, "int64"),
+        ("provider", Insurance.provider, "string"),
+        ("policy_type", Insurance.policy_type, "string"),
+        ("premium", Insurance.premium, "float64"),
+        ("renewal_date", Insurance.renewal_date, "date32"),
+    ],
+}
+
+ORDERING = {
+    "expenses": (Expense.date, Expense.expense_id),
+    "loans": (Loan.due_date, Loan.loan_id),
+    "insurances": (Insurance.renewal_date, Insurance.insurance_id),
+}
+
+
+def export_select(ledger, criteria):
+    """
+    Plain column SELECT of a filtered ledger in listing order (newest first),
+    so rows stream as tuples without building ORM objects
+    """
+    stmt = select(*(column.label(name) for name, column, _ in EXPORT_COLUMNS[ledger]))
+    if ledger == "expenses":
+        stmt = stmt.select_from(Expense).outerjoin(Category, Expense.category_id == Category.category_id)
+    date_column, id_column = ORDERING[ledger]
+    return stmt.where(*criteria).order_by(date_column.desc().nulls_first(), id_column.desc())
+
+
+def _stream_batches(stmt):
+    """
+    Execute `stmt` with a server side cursor (yield_per) and yield lists of
+    rows, EXPORT_BATCH_SIZE at a time
+    """
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH_SIZE))
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def _csv_stream(ledger, stmt):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # header goes out before the query runs, so the download starts right away
+    writer.writerow([name for name, _, _ in EXPORT_COLUMNS[ledger]])
+    yield buffer.getvalue()
+
+    for batch in _stream_batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+class _ChunkSink:
+    """Write-only file object collecting what the parquet writer emits until it is drained."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _parquet_stream(ledger, stmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {"int64": pa.int64(), "float64": pa.float64(), "string": pa.string(),
+             "date32": pa.date32(), "timestamp": pa.timestamp("us")}
+    columns = EXPORT_COLUMNS[ledger]
+    schema = pa.schema([(name, types[kind]) for name, _, kind in columns])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    yield sink.drain()
+
+    # one row group per cursor batch, each is flushed to the client as soon as it is written
+    for batch in _stream_batches(stmt):
+        arrays = [pa.array([row[i] for row in batch], type=schema.field(i).type) for i in range(len(columns))]
+        writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+FORMATS = {
+    "csv": (_csv_stream, "text/csv"),
+    "parquet": (_parquet_stream, "application/vnd.apache.parquet"),
+}
+
+
+@bp.route("/<any(expenses, loans, insurances):ledger>.<any(csv, parquet):fmt>")
+@login_required
+def export_ledger(ledger, fmt):
+    """
+    Download a ledger filtered like the dashboard (same query parameters), streamed
+    from a server side cursor so the full result is never held in memory.
+    """
+    base_logger.info(f"Exporting {ledger} as {fmt}")
+    try:
+        filters = parse_dashboard_filters(request.args)
+    except ValueError:
+        return jsonify({"error": "Dates must use the YYYY-MM-DD format."}), 400
+
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError:
+            return jsonify({"error": "Parquet export needs the pyarrow package."}), 501
+
+    stmt = export_select(ledger, build_ledger_criteria(current_user.user_id, filters)[ledger])
+    generate, mimetype = FORMATS[fmt]
+
+    response = Response(stream_with_context(generate(ledger, stmt)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={ledger}.{fmt}"
+    # ask proxies (nginx) not to buffer the stream
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
@@ -1,68 +1,208 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
-from sqlalchemy import extract, func
-from .schema import Expense, Loan, Insurance, Category, db
+from sqlalchemy import String, extract, func, literal, select, union_all
+from sqlalchemy.orm import joinedload
+from .schema import (Expense, Loan, Insurance,
+                     ExpenseMonthly, LoanMonthly, InsuranceMonthly, db)
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+from .categories import category_registry
+from .rollups import (rollups_cover, expense_rollup_filters,
+                      loan_rollup_filters, insurance_rollup_filters)
 
 
-def get_filtered_expenses(user_id, selected_categories, start_date, end_date):
+def expense_filters(user_id, selected_categories, start_date, end_date):
     """
-    Filter out expenses based on categories, start and end date
+    Build the WHERE criteria shared by every expense query
     """
-    expense_query = Expense.query.filter_by(user_id=user_id)
+    criteria = [Expense.user_id == user_id]
 
     if selected_categories:
-        expense_query = expense_query.filter(Expense.category.has(Category.name.in_(selected_categories)))
+        criteria.append(Expense.category_id.in_(category_registry.ids_for(selected_categories)))
     if start_date:
-        expense_query = expense_query.filter(Expense.date >= start_date)
+        criteria.append(Expense.date >= start_date)
     if end_date:
-        expense_query = expense_query.filter(Expense.date <= end_date)
+        # Expense.date carries a time of day, include the whole end date
+        criteria.append(Expense.date < end_date + timedelta(days=1))
 
-    expenses = expense_query.all()
-    total_expenses = sum(e.amount for e in expenses) if expenses else 0
+    return criteria
 
-    # Monthly Chart
-    monthly_expenses_query = (
-        db.session.query(
-            extract("year", Expense.date).label("year"),
-            extract("month", Expense.date).label("month"),
-            func.sum(Expense.amount).label("total")
-        )
-        .filter(Expense.user_id == user_id)
-    )
+
+def loan_filters(user_id, selected_lenders, selected_categories, start_date, end_date):
+    """
+    Build the WHERE criteria shared by every loan query
+    """
+    criteria = [Loan.user_id == user_id]
+
+    if selected_lenders:
+        criteria.append(Loan.lender.in_(selected_lenders))
     if selected_categories:
-        monthly_expenses_query = monthly_expenses_query.join(Category).filter(Category.name.in_(selected_categories))
+        criteria.append(Loan.loan_category.in_(selected_categories))
     if start_date:
-        monthly_expenses_query = monthly_expenses_query.filter(Expense.date >= start_date)
+        criteria.append(Loan.due_date >= start_date)
     if end_date:
-        monthly_expenses_query = monthly_expenses_query.filter(Expense.date <= end_date)
+        criteria.append(Loan.due_date <= end_date)
+
+    return criteria
+
+
+def insurance_filters(user_id, selected_providers, selected_types, start_date, end_date):
+    """
+    Build the WHERE criteria shared by every insurance query
+    """
+    criteria = [Insurance.user_id == user_id]
+
+    if selected_providers:
+        criteria.append(Insurance.provider.in_(selected_providers))
+    if selected_types:
+        criteria.append(Insurance.policy_type.in_(selected_types))
+    if start_date:
+        criteria.append(Insurance.renewal_date >= start_date)
+    if end_date:
+        criteria.append(Insurance.renewal_date <= end_date)
+
+    return criteria
+
+
+def _ledger_columns(ledger):
+    """
+    (model, date column, id column, amount column) of a ledger
+    """
+    if ledger == "expenses":
+        return Expense, Expense.date, Expense.expense_id, Expense.amount
+    if ledger == "loans":
+        return Loan, Loan.due_date, Loan.loan_id, Loan.amount
+    if ledger == "insurances":
+        return Insurance, Insurance.renewal_date, Insurance.insurance_id, Insurance.premium
+    raise ValueError(f"Unknown ledger: {ledger}")
+
+
+def get_ledger_page(ledger, criteria, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    One keyset page (newest first) of a ledger listing, returns (rows, next_cursor)
+    """
+    model, date_column, id_column, _ = _ledger_columns(ledger)
+    query = model.query
+    if model is Expense:
+        query = query.options(joinedload(Expense.category))
+
+    return keyset_page(query.filter(*criteria), date_column, id_column, after, limit)
+
+
+def _summary_select(ledger, criteria):
+    model, date_column, id_column, amount_column = _ledger_columns(ledger)
+    return (
+        select(
+            literal(ledger, String).label("ledger"),
+            func.count(id_column).label("count"),
+            func.coalesce(func.sum(amount_column), 0).label("total"),
+            func.min(amount_column).label("min_amount"),
+            func.max(amount_column).label("max_amount"),
+            func.min(date_column).label("first_date"),
+            func.max(date_column).label("last_date"),
+        )
+        .where(*criteria)
+    )
+
+
+def _summary_from_row(row):
+    return {
+        "count": row.count,
+        "total": float(row.total),
+        "min_amount": row.min_amount,
+        "max_amount": row.max_amount,
+        "first_date": row.first_date,
+        "last_date": row.last_date,
+    }
+
+
+def get_ledger_summary(ledger, criteria):
+    """
+    COUNT/SUM/MIN/MAX of a filtered ledger computed in the database, no rows are loaded
+    """
+    return _summary_from_row(db.session.execute(_summary_select(ledger, criteria)).one())
+
+
+def get_ledger_summaries(criteria_by_ledger):
+    """
+    get_ledger_summary for several ledgers in a single UNION ALL round trip,
+    keyed by ledger name
+    """
+    statement = union_all(*(
+        _summary_select(ledger, criteria) for ledger, criteria in criteria_by_ledger.items()
+    ))
+    return {row.ledger: _summary_from_row(row) for row in db.session.execute(statement)}
+
+
+def get_filtered_expenses(user_id, selected_categories, start_date, end_date):
+    """
+    Filter out expenses based on categories, start and end date
+    """
+    criteria = expense_filters(user_id, selected_categories, start_date, end_date)
+
+    expenses = Expense.query.options(joinedload(Expense.category)).filter(*criteria).all()
+    total_expenses = get_ledger_summary("expenses", criteria)["total"]
+
+    # Monthly and Category Charts, from the monthly rollup when the range is whole months
+    if rollups_cover(start_date, end_date):
+        rollup_criteria = expense_rollup_filters(user_id, selected_categories, start_date, end_date)
+        monthly_expenses = (
+            db.session.query(
+                extract("year", ExpenseMonthly.month).label("year"),
+                extract("month", ExpenseMonthly.month).label("month"),
+                func.sum(ExpenseMonthly.total).label("total")
+            )
+            .filter(*rollup_criteria)
+            .group_by("year", "month")
+            .order_by("year", "month")
+            .all()
+        )
+        # undated expenses have no month bucket, take them from the raw ledger
+        category_amounts = union_all(
+            select(ExpenseMonthly.category_id, ExpenseMonthly.total.label("amount")).where(*rollup_criteria),
+            select(Expense.category_id, Expense.amount.label("amount")).where(*criteria, Expense.date.is_(None)),
+        ).subquery()
+        category_results = (
+            db.session.query(
+                category_amounts.c.category_id,
+                func.sum(category_amounts.c.amount).label("total"),
+            )
+            .filter(category_amounts.c.category_id.isnot(None))
+            .group_by(category_amounts.c.category_id)
+            .all()
+        )
+    else:
+        monthly_expenses = (
+            db.session.query(
+                extract("year", Expense.date).label("year"),
+                extract("month", Expense.date).label("month"),
+                func.sum(Expense.amount).label("total")
+            )
+            .filter(*criteria, Expense.date.isnot(None))
+            .group_by("year", "month")
+            .order_by("year", "month")
+            .all()
+        )
+        category_results = (
+            db.session.query(
+                Expense.category_id,
+                func.sum(Expense.amount).label("total"),
+            )
+            .filter(*criteria, Expense.category_id.isnot(None))
+            .group_by(Expense.category_id)
+            .all()
+        )
 
-    monthly_expenses = monthly_expenses_query.group_by("year", "month").order_by("year", "month").all()
     expense_chart_data = [
         {"label": f"{int(row.year)}-{int(row.month):02d}", "value": float(row.total)}
         for row in monthly_expenses
     ] if monthly_expenses else []
 
-    # Category Chart
-    category_query = (
-        db.session.query(
-            Category.name,
-            func.sum(Expense.amount).label("total"),
-        )
-        .join(Category, Expense.category_id == Category.category_id)
-        .filter(Expense.user_id == user_id)
-    )
-    if selected_categories:
-        category_query = category_query.filter(Category.name.in_(selected_categories))
-    if start_date:
-        category_query = category_query.filter(Expense.date >= start_date)
-    if end_date:
-        category_query = category_query.filter(Expense.date <= end_date)
-
-    category_results = category_query.group_by(Category.name).order_by(Category.name).all()
+    # grouped by id, labelled from the category registry
+    category_totals = {category_registry.name_of(row.category_id): float(row.total) for row in category_results}
     category_chart_data = [
-        {"label": row.name, "value": float(row.total)}
-        for row in category_results
-    ] if category_results else []
+        {"label": name, "value": category_totals[name]}
+        for name in sorted(category_totals)
+    ] if category_totals else []
 
     return expenses, total_expenses, expense_chart_data, category_chart_data
 
@@ -71,37 +211,34 @@ def get_filtered_loans(user_id, selected_lenders, selected_categories, start_dat
     """
     Filter out loans based on lenders, categories, start and end date
     """
-    loan_query = Loan.query.filter_by(user_id=user_id)
-
-    if selected_lenders:
-        loan_query = loan_query.filter(Loan.lender.in_(selected_lenders))
-    if selected_categories:
-        loan_query = loan_query.filter(Loan.loan_category.in_(selected_categories))
-    if start_date:
-        loan_query = loan_query.filter(Loan.due_date >= start_date)
-    if end_date:
-        loan_query = loan_query.filter(Loan.due_date <= end_date)
+    criteria = loan_filters(user_id, selected_lenders, selected_categories, start_date, end_date)
 
-    loans = loan_query.all()
+    loans = Loan.query.filter(*criteria).all()
 
-    # Loan Chart
-    loan_chart_query = (
-        db.session.query(
-            extract("year", Loan.due_date).label("year"),
-            func.sum(Loan.amount).label("total")
+    # Loan Chart, from the monthly rollup when the range is whole months
+    if rollups_cover(start_date, end_date):
+        loan_chart_results = (
+            db.session.query(
+                extract("year", LoanMonthly.month).label("year"),
+                func.sum(LoanMonthly.total).label("total")
+            )
+            .filter(*loan_rollup_filters(user_id, selected_lenders, selected_categories, start_date, end_date))
+            .group_by("year")
+            .order_by("year")
+            .all()
+        )
+    else:
+        loan_chart_results = (
+            db.session.query(
+                extract("year", Loan.due_date).label("year"),
+                func.sum(Loan.amount).label("total")
+            )
+            .filter(*criteria, Loan.due_date.isnot(None))
+            .group_by("year")
+            .order_by("year")
+            .all()
         )
-        .filter(Loan.user_id == user_id, Loan.due_date.isnot(None))
-    )
-    if selected_lenders:
-        loan_chart_query = loan_chart_query.filter(Loan.lender.in_(selected_lenders))
-    if selected_categories:
-        loan_chart_query = loan_chart_query.filter(Loan.loan_category.in_(selected_categories))
-    if start_date:
-        loan_chart_query = loan_chart_query.filter(Loan.due_date >= start_date)
-    if end_date:
-        loan_chart_query = loan_chart_query.filter(Loan.due_date <= end_date)
 
-    loan_chart_results = loan_chart_query.group_by("year").order_by("year").all()
     loan_chart_data = [
         {"label": str(int(r.year)), "value": float(r.total)}
         for r in loan_chart_results
@@ -115,39 +252,36 @@ def get_filtered_insurances(user_id, selected_providers, selected_types, start_d
     """
     Filter out insurances based on providers and types
     """
-    insurance_query = Insurance.query.filter_by(user_id=user_id)
+    criteria = insurance_filters(user_id, selected_providers, selected_types, start_date, end_date)
 
-    if selected_providers:
-        insurance_query = insurance_query.filter(Insurance.provider.in_(selected_providers))
-    if selected_types:
-        insurance_query = insurance_query.filter(Insurance.policy_type.in_(selected_types))
-    if start_date:
-        insurance_query = insurance_query.filter(Insurance.renewal_date >= start_date)
-    if end_date:
-        insurance_query = insurance_query.filter(Insurance.renewal_date <= end_date)
-
-    insurances = insurance_query.all()
-    total_premium = sum(i.premium for i in insurances) if insurances else 0
+    insurances = Insurance.query.filter(*criteria).all()
+    total_premium = get_ledger_summary("insurances", criteria)["total"]
 
-    # Chart
-    insurance_chart_query = (
-        db.session.query(
-            extract("year", Insurance.renewal_date).label("year"),
-            extract("month", Insurance.renewal_date).label("month"),
-            func.sum(Insurance.premium).label("total")
+    # Chart, from the monthly rollup when the range is whole months
+    if rollups_cover(start_date, end_date):
+        insurance_chart_results = (
+            db.session.query(
+                extract("year", InsuranceMonthly.month).label("year"),
+                extract("month", InsuranceMonthly.month).label("month"),
+                func.sum(InsuranceMonthly.total).label("total")
+            )
+            .filter(*insurance_rollup_filters(user_id, selected_providers, selected_types, start_date, end_date))
+            .group_by("year", "month")
+            .order_by("year", "month")
+            .all()
+        )
+    else:
+        insurance_chart_results = (
+            db.session.query(
+                extract("year", Insurance.renewal_date).label("year"),
+                extract("month", Insurance.renewal_date).label("month"),
+                func.sum(Insurance.premium).label("total")
+            )
+            .filter(*criteria, Insurance.renewal_date.isnot(None))
+            .group_by("year", "month")
+            .order_by("year", "month")
+            .all()
         )
-        .filter(Insurance.user_id == user_id, Insurance.renewal_date.isnot(None))
-    )
-    if selected_providers:
-        insurance_chart_query = insurance_chart_query.filter(Insurance.provider.in_(selected_providers))
-    if selected_types:
-        insurance_chart_query = insurance_chart_query.filter(Insurance.policy_type.in_(selected_types))
-    if start_date:
-        insurance_chart_query = insurance_chart_query.filter(Insurance.renewal_date >= start_date)
-    if end_date:
-        insurance_chart_query = insurance_chart_query.filter(Insurance.renewal_date <= end_date)
-
-    insurance_chart_results = insurance_chart_query.group_by("year", "month").order_by("year", "month").all()
     monthly_insurance = defaultdict(float)
     for row in insurance_chart_results:
         label = f"{int(row.year)}-{int(row.month):02d}"
@@ -158,4 +292,4 @@ def get_filtered_insurances(user_id, selected_providers, selected_types, start_d
         for label in sorted(monthly_insurance)
     ] if monthly_insurance else []
 
-    return insurances, total_premium, insurance_chart_data
\ No newline at end of file
+    return insurances, total_premium, insurance_chart_data
@@ -0,0 +1,84 @@
+from sqlalchemy import select
+
+from .cache import MemoryBackend
+from .schema import User, db
+
+
+class UserPrincipal:
+    """
+    What an authenticated request knows about its user: the id the routes filter
+    by, the name the dashboard greets and the verified flag. Not bound to a
+    session, so it is safe to share between requests and threads.
+    """
+
+    __slots__ = ("user_id", "first_name", "is_verified")
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, user_id, first_name, is_verified):
+        self.user_id = user_id
+        self.first_name = first_name
+        self.is_verified = is_verified
+
+    def get_id(self):
+        return str(self.user_id)
+
+    def __eq__(self, other):
+        return getattr(other, "user_id", None) == self.user_id
+
+    def __hash__(self):
+        return hash(self.user_id)
+
+    def __repr__(self):
+        return f"<UserPrincipal {self.user_id}>"
+
+
+class IdentityCache:
+    """
+    Flask-Login user loader backed by a short-TTL in-process LRU, so most requests
+    do not touch the users table. Call invalidate() whenever a cached field or the
+    account's credentials change; other worker processes catch up within the TTL.
+
+    ttl = 0 disables caching (every request loads the user).
+    """
+
+    def __init__(self, ttl=60, max_entries=4096):
+        self.ttl = ttl
+        self.backend = MemoryBackend(max_entries)
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.ttl = cfg.get("USER_CACHE_TTL", 60)
+        self.backend = MemoryBackend(cfg.get("USER_CACHE_MAX_ENTRIES", 4096))
+
+    def load(self, user_id):
+        user_id = int(user_id)
+        if self.ttl:
+            principal = self.backend.get(user_id)
+            if principal is not None:
+                self.hits += 1
+                return principal
+        self.misses += 1
+
+        row = db.session.execute(
+            select(User.user_id, User.first_name, User.is_verified).where(User.user_id == user_id)
+        ).first()
+        if row is None:
+            return None
+        principal = UserPrincipal(*row)
+        if self.ttl:
+            self.backend.set(user_id, principal, self.ttl)
+        return principal
+
+    def invalidate(self, user_id):
+        self.backend.delete(int(user_id))
+
+    def stats(self):
+        return {"ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+identity_cache = IdentityCache()
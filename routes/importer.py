@@ -0,0 +1,362 @@
+import csv
+import io
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from sqlalchemy import func, insert, select
+from .schema import Expense, Category
+from .rollups import record_rows_in_rollups
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_IMPORT_CATEGORY = "Groceries"
+MAX_REPORTED_ERRORS = 20
+
+# accepted header names (lower case) for each statement field
+COLUMN_ALIASES = {
+    "date": ["date", "transaction date", "txn date", "posted date", "posting date", "value date"],
+    "amount": ["amount", "transaction amount"],
+    "debit": ["debit", "debit amount", "withdrawal", "withdrawal amt.", "withdrawal amount", "paid out"],
+    "description": ["description", "narration", "details", "particulars", "memo", "payee", "remarks"],
+    "category": ["category"],
+}
+
+DATE_FORMATS = ["%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%d/%m/%y", "%m/%d/%Y", "%d %b %Y", "%d-%b-%Y", "%Y%m%d"]
+
+# statement description keywords -> category name, used when the file has no category column
+CATEGORY_KEYWORDS = {
+    "Groceries": ["grocery", "supermarket", "mart", "bigbasket", "blinkit"],
+    "Electricity": ["electricity", "power", "bescom", "tneb"],
+    "Gas": ["gas", "lpg", "indane", "hp gas"],
+    "Medicines": ["pharmacy", "medical", "chemist", "apollo"],
+    "Vehicle Maintenance": ["fuel", "petrol", "diesel", "car service", "tyre"],
+    "Clothes": ["apparel", "fashion", "clothing", "myntra"],
+    "Trips/Vacations": ["hotel", "airline", "flight", "irctc", "travel"],
+    "Housekeeping": ["housekeeping", "laundry", "maid"],
+    "Loan": ["emi", "loan"],
+    "Insurance": ["insurance", "premium", "policy"],
+    "House Maintenance": ["plumber", "electrician", "hardware", "repair"],
+}
+
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+_AMOUNT_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?|\.\d+")
+
+
+class ImportRowError(ValueError):
+    """Raised when a statement line cannot be turned into an expense."""
+
+
+def _date_parser(date_format=None):
+    """
+    Parse statement dates with `date_format`, or by trying DATE_FORMATS.
+    The format that matched last is tried first, statements use a single one.
+    """
+    formats = [date_format] if date_format else list(DATE_FORMATS)
+
+    def parse(text):
+        text = (text or "").strip()
+        if not text:
+            raise ImportRowError("missing date")
+        for i, fmt in enumerate(formats):
+            try:
+                value = datetime.strptime(text, fmt)
+            except ValueError:
+                continue
+            if i:
+                formats.insert(0, formats.pop(i))
+            return value
+        raise ImportRowError(f"unrecognised date {text!r}")
+
+    return parse
+
+
+def _parse_amount(text):
+    """'1,234.50', '-₹ 99', 'Rs. 1,200.00', '(12.00)', '45.00-' -> float"""
+    text = (text or "").strip()
+    if not text:
+        return None
+    number = _AMOUNT_NUMBER.search(text)
+    if number is None:
+        raise ImportRowError(f"unrecognised amount {text!r}")
+    value = float(number.group().replace(",", ""))
+    negative = (text.startswith("(") and text.endswith(")")) or "-" in text[:number.start()] or text.endswith("-")
+    return -value if negative else value
+
+
+def _resolve_columns(header, mapping=None):
+    """
+    Map statement fields to CSV header names, explicit `mapping` entries win
+    over the COLUMN_ALIASES guesses
+    """
+    by_name = {name.strip().lower(): name for name in header if name}
+    columns = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_name:
+                columns[field] = by_name[alias]
+                break
+    for field, name in (mapping or {}).items():
+        if name not in header:
+            raise ValueError(f"Column {name!r} mapped to {field} is not in the file")
+        columns[field] = name
+
+    if "date" not in columns or not ({"amount", "debit"} & set(columns)):
+        raise ValueError(f"Could not find date and amount columns in {header}")
+    return columns
+
+
+def parse_csv(stream, mapping=None, delimiter=","):
+    """
+    Yield one raw record per CSV line: dict with line, date, amount, description, category
+    and debit. When the file has a debit column, amount is the debit (debit True) and
+    lines without one (credits) get amount None; otherwise amount is signed.
+    """
+    reader = csv.reader(stream, delimiter=delimiter)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _resolve_columns(header, mapping)
+    positions = {field: header.index(name) for field, name in columns.items()}
+    amount_position = positions.get("debit", positions.get("amount"))
+
+    def cell(values, field, position=None):
+        position = positions.get(field) if position is None else position
+        if position is None or position >= len(values):
+            return None
+        return values[position]
+
+    for line, values in enumerate(reader, start=2):
+        if not any(values):
+            continue
+        yield {
+            "line": line,
+            "date": cell(values, "date"),
+            "amount": cell(values, "amount", amount_position),
+            "description": cell(values, "description"),
+            "category": cell(values, "category"),
+            "debit": "debit" in positions,
+        }
+
+
+def _ofx_tags(stream, read_size=65536):
+    """Yield (closing, tag, value) for every tag of an OFX (SGML or XML) document, reading it in blocks"""
+    pending = ""
+    while True:
+        block = stream.read(read_size)
+        pending += block
+        cut = pending.rfind("<") if block else len(pending)
+        for match in _OFX_TAG.finditer(pending, 0, max(cut, 0)):
+            yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+        if not block:
+            return
+        pending = pending[max(cut, 0):]
+
+
+def parse_ofx(stream):
+    """
+    Yield one raw record per <STMTTRN> of an OFX/QFX statement. OFX signs debits
+    negative, so callers should import it with sign="negative".
+    """
+    transaction = None
+    count = 0
+    for closing, tag, value in _ofx_tags(stream):
+        if tag == "STMTTRN":
+            if not closing:
+                transaction = {}
+                continue
+            if transaction is not None:
+                count += 1
+                yield {
+                    "line": count,
+                    "date": (transaction.get("DTPOSTED") or "")[:8],
+                    "amount": transaction.get("TRNAMT"),
+                    "description": transaction.get("NAME") or transaction.get("MEMO"),
+                    "category": None,
+                }
+            transaction = None
+        elif transaction is not None and not closing and value:
+            transaction[tag] = value
+
+
+class CategoryMapper:
+    """
+    Resolve statement category names (case-insensitive) or description keywords
+    to category ids, with a fallback category for everything else
+    """
+
+    def __init__(self, categories, default_category=DEFAULT_IMPORT_CATEGORY):
+        self.ids = {name.lower(): category_id for category_id, name in categories}
+        self.default_id = self.ids.get((default_category or "").lower())
+        self.keywords = [
+            (keyword, self.ids[name.lower()])
+            for name, keywords in CATEGORY_KEYWORDS.items() if name.lower() in self.ids
+            for keyword in keywords
+        ]
+
+    def resolve(self, category, description):
+        if category:
+            category_id = self.ids.get(category.strip().lower())
+            if category_id is not None:
+                return category_id
+        text = (description or "").lower()
+        for keyword, category_id in self.keywords:
+            if keyword in text:
+                return category_id
+        if self.default_id is None:
+            raise ImportRowError(f"no category for {category or description!r}")
+        return self.default_id
+
+
+def _to_row(record, user_id, parse_date, categories, sign):
+    """
+    Turn a raw record into Expense column values, or None when the line is not an
+    expense (a credit, or a zero amount). Amounts from a debit column are always
+    expenses, `sign` only applies to signed amounts.
+    """
+    amount = _parse_amount(record["amount"])
+    if not amount:
+        return None
+    if not record.get("debit"):
+        if (sign == "negative" and amount > 0) or (sign == "positive" and amount < 0):
+            return None
+
+    description = (record["description"] or "").strip()[:200] or None
+    return {
+        "amount": round(abs(amount), 2),
+        "description": description,
+        "date": parse_date(record["date"]),
+        "user_id": user_id,
+        "category_id": categories.resolve(record["category"], description),
+    }
+
+
+def _dedup_key(row):
+    return row["date"].date(), round(row["amount"], 2), row["description"] or ""
+
+
+def _drop_existing(conn, user_id, rows, known_up_to, matched):
+    """
+    Remove rows the user already had before the import (expense_id <= known_up_to, so
+    rows inserted by earlier chunks of the same file do not count). Keys are (day,
+    amount, description) and are counted, so two identical coffees on one day are kept
+    unless both already exist; `matched` carries the existing rows earlier chunks
+    already paired off and is updated. Only the chunk's date span is read, through the
+    (user_id, date) index.
+    """
+    first = min(row["date"] for row in rows).replace(hour=0, minute=0, second=0, microsecond=0)
+    last = max(row["date"] for row in rows).replace(hour=0, minute=0, second=0, microsecond=0)
+    existing = Counter(
+        (d.date() if isinstance(d, datetime) else d, round(amount, 2), description or "")
+        for d, amount, description in conn.execute(
+            select(Expense.date, Expense.amount, Expense.description).where(
+                Expense.user_id == user_id,
+                Expense.date >= first,
+                Expense.date < last + timedelta(days=1),
+                Expense.expense_id <= known_up_to,
+            )
+        )
+    )
+
+    existing.subtract(matched)
+
+    fresh = []
+    for row in rows:
+        key = _dedup_key(row)
+        if existing[key] > 0:
+            existing[key] -= 1
+            matched[key] += 1
+        else:
+            fresh.append(row)
+    return fresh
+
+
+def _copy_rows(conn, rows):
+    """COPY ... FROM STDIN on psycopg2 connections, multi-row INSERT otherwise"""
+    cursor = conn.connection.dbapi_connection.cursor() if conn.dialect.name == "postgresql" else None
+    if cursor is None or not hasattr(cursor, "copy_expert"):
+        if cursor is not None:
+            cursor.close()
+        conn.execute(insert(Expense.__table__), rows)
+        return
+
+    columns = ["amount", "description", "date", "user_id", "category_id"]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[c] for c in columns])
+    buffer.seek(0)
+    try:
+        cursor.copy_expert(
+            f"COPY {Expense.__tablename__} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+    finally:
+        cursor.close()
+
+
+def import_expenses(conn, user_id, records, sign=None, date_format=None,
+                    default_category=DEFAULT_IMPORT_CATEGORY, chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Insert the expenses of a parsed statement (parse_csv/parse_ofx records) for one user.
+
+    Records are consumed `chunk_size` at a time; each chunk is deduplicated against the
+    user's existing expenses, inserted with COPY/executemany, folded into the monthly
+    rollups and committed, so memory stays bounded whatever the file size and a failed
+    import can simply be re-run. `sign` selects which signed amounts are expenses:
+    "negative" (bank statements, where credits are positive), "positive" or None for
+    every non zero amount. `progress` is called with the running stats after every chunk.
+    """
+    parse_date = _date_parser(date_format)
+    categories = CategoryMapper(conn.execute(select(Category.category_id, Category.name)).all(), default_category)
+    stats = {"read": 0, "inserted": 0, "duplicates": 0, "skipped": 0, "invalid": 0, "errors": []}
+    # duplicates are looked for among the expenses that existed before this import
+    known_up_to = conn.scalar(select(func.max(Expense.expense_id))) or 0
+    matched = Counter()
+
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            break
+
+        rows = []
+        for record in chunk:
+            try:
+                row = _to_row(record, user_id, parse_date, categories, sign)
+            except ImportRowError as e:
+                stats["invalid"] += 1
+                if len(stats["errors"]) < MAX_REPORTED_ERRORS:
+                    stats["errors"].append(f"line {record['line']}: {e}")
+                continue
+            if row is None:
+                stats["skipped"] += 1
+            else:
+                rows.append(row)
+        stats["read"] += len(chunk)
+
+        if rows:
+            fresh = _drop_existing(conn, user_id, rows, known_up_to, matched)
+            stats["duplicates"] += len(rows) - len(fresh)
+            if fresh:
+                _copy_rows(conn, fresh)
+                record_rows_in_rollups(conn, Expense, fresh)
+                stats["inserted"] += len(fresh)
+        conn.commit()
+
+        if progress is not None:
+            progress(stats)
+
+    return stats
+
+
+def parse_statement(stream, fmt, mapping=None, delimiter=","):
+    """Pick the parser for `fmt` ("csv" or "ofx")"""
+    if fmt == "ofx":
+        return parse_ofx(stream)
+    if fmt == "csv":
+        return parse_csv(stream, mapping, delimiter)
+    raise ValueError(f"Unsupported statement format {fmt!r}")
+
+
+def statement_format(filename):
+    """Guess the statement format from a file name"""
+    return "ofx" if filename.lower().endswith((".ofx", ".qfx")) else "csv"
@@ -0,0 +1,57 @@
+import hmac
+import os
+
+from flask import Blueprint, Response, abort, current_app, jsonify, request
+
+from .cache import dashboard_cache
+from .categories import category_registry
+from .identity import identity_cache
+from .mailer import mail_queue
+from .metrics import metrics as prometheus_metrics
+from .passwords import password_hasher
+from .pool import pool_metrics
+from .profiler import query_profiler
+
+bp = Blueprint("internal", __name__, url_prefix="/internal")
+
+LOCAL_ADDRESSES = ("127.0.0.1", "::1")
+
+
+def _authorized():
+    token = current_app.config.get("METRICS_TOKEN")
+    if not token:
+        # behind a reverse proxy on the same host every request comes from loopback,
+        # so without a token the endpoints only answer the development server
+        return current_app.debug and request.remote_addr in LOCAL_ADDRESSES
+    supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+@bp.route("/metrics")
+def metrics():
+    """
+    Figures of the worker process that answers: each gunicorn worker keeps its own,
+    so repeated calls may land on different workers
+    """
+    if not _authorized():
+        abort(404)
+
+    return jsonify({
+        "pid": os.getpid(),
+        "queries": query_profiler.stats(),
+        "pool": pool_metrics.stats(),
+        "dashboard_cache": dashboard_cache.stats(),
+        "identity_cache": identity_cache.stats(),
+        "category_registry": category_registry.stats(),
+        "password_hasher": password_hasher.stats(),
+        "mail_queue": mail_queue.stats(),
+    })
+
+
+@bp.route("/prometheus")
+def prometheus():
+    """Prometheus text exposition, summed over all workers when METRICS_DIR is set"""
+    if not _authorized():
+        abort(404)
+
+    return Response(prometheus_metrics.render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,207 @@
+import queue
+import threading
+import time
+from smtplib import SMTP, SMTP_SSL, SMTPException, SMTPServerDisconnected
+
+from logger.log_utility import base_logger
+
+from .metrics import smtp_send_duration
+
+
+class SMTPConnection:
+    """
+    One authenticated SMTP session, opened on first use and reopened when the
+    server drops it (idle timeouts, restarts)
+    """
+
+    def __init__(self, server, port, username=None, password=None, use_tls=True, use_ssl=False, timeout=30):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._smtp = None
+
+    def connect(self):
+        if self.use_ssl:
+            smtp = SMTP_SSL(self.server, self.port, timeout=self.timeout)
+            smtp.ehlo()
+        else:
+            smtp = SMTP(self.server, self.port, timeout=self.timeout)
+            smtp.ehlo()
+            if self.use_tls:
+                smtp.starttls()
+                smtp.ehlo()  # Call ehlo() again after starttls()
+        if self.username and self.password:
+            smtp.login(self.username, self.password)
+        self._smtp = smtp
+
+    def close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except (SMTPException, OSError):
+            self._smtp.close()
+        self._smtp = None
+
+    def send(self, msg):
+        """Send on the open session, reconnecting once if the server hung up on it."""
+        if self._smtp is None:
+            self.connect()
+        try:
+            self._smtp.send_message(msg)
+        except (SMTPServerDisconnected, ConnectionError):
+            self.close()
+            self.connect()
+            self._smtp.send_message(msg)
+
+
+class MailQueue:
+    """
+    Background email delivery: requests enqueue messages and return immediately,
+    a small pool of worker threads sends them over persistent SMTP sessions,
+    retrying failures with exponential backoff.
+
+    Workers start on the first enqueue, so every (forked) server process gets its own.
+    """
+
+    def __init__(self):
+        self.config = {}
+        self.workers = 2
+        self.max_retries = 5
+        self.backoff = 1.0
+        self.idle_timeout = 60
+        self.synchronous = False
+        self._queue = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.config = {
+            "server": cfg.get("MAIL_SERVER"),
+            "port": int(cfg.get("MAIL_PORT", 587)),
+            "username": cfg.get("MAIL_USERNAME"),
+            "password": cfg.get("MAIL_PASSWORD"),
+            "use_tls": cfg.get("MAIL_USE_TLS", True),
+            "use_ssl": cfg.get("MAIL_USE_SSL", False),
+            "timeout": cfg.get("MAIL_TIMEOUT", 30),
+        }
+        self.workers = cfg.get("MAIL_WORKERS", 2)
+        self.max_retries = cfg.get("MAIL_MAX_RETRIES", 5)
+        self.backoff = cfg.get("MAIL_RETRY_BACKOFF", 1.0)
+        self.synchronous = not cfg.get("MAIL_ASYNC", True)
+        self._queue = queue.Queue(maxsize=cfg.get("MAIL_QUEUE_SIZE", 1000))
+        base_logger.info(f"Mail delivery: {'synchronous' if self.synchronous else f'{self.workers} background workers'}")
+
+    def _count(self, counter):
+        # incremented from request threads, mail workers and retry timers
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _start(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for i in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"mail-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def enqueue(self, msg):
+        """
+        Hand a message over for delivery. Returns False when it could not be queued
+        (queue full); delivery failures after that are only logged.
+        """
+        if self.synchronous:
+            connection = SMTPConnection(**self.config)
+            try:
+                self._send(connection, msg)
+            finally:
+                connection.close()
+            self._count("sent")
+            return True
+
+        if len(self._threads) < self.workers:
+            self._start()
+        try:
+            self._queue.put_nowait((msg, 0))
+        except queue.Full:
+            base_logger.error(f"Mail queue full, dropping message to {msg['To']}")
+            return False
+        return True
+
+    def _work(self):
+        connection = SMTPConnection(**self.config)
+        while True:
+            try:
+                msg, attempt = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                # do not keep idle sessions open, servers drop them anyway
+                connection.close()
+                continue
+
+            try:
+                self._send(connection, msg)
+                self._count("sent")
+            except (SMTPException, OSError):
+                connection.close()
+                if attempt + 1 >= self.max_retries:
+                    self._count("failed")
+                    base_logger.exception(f"Giving up on email to {msg['To']} after {attempt + 1} attempts")
+                else:
+                    delay = self.backoff * 2 ** attempt
+                    self._count("retried")
+                    base_logger.warning(f"Email to {msg['To']} failed (attempt {attempt + 1}), retrying in {delay:.0f}s")
+                    self._retry_later(msg, attempt + 1, delay)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _send(connection, msg):
+        started = time.perf_counter()
+        try:
+            connection.send(msg)
+        except Exception:
+            smtp_send_duration.observe(time.perf_counter() - started, result="error")
+            raise
+        smtp_send_duration.observe(time.perf_counter() - started, result="sent")
+
+    def _retry_later(self, msg, attempt, delay):
+        timer = threading.Timer(delay, self._requeue, args=(msg, attempt))
+        timer.daemon = True
+        timer.start()
+
+    def _requeue(self, msg, attempt):
+        try:
+            self._queue.put_nowait((msg, attempt))
+        except queue.Full:
+            self._count("failed")
+            base_logger.error(f"Mail queue full, dropping retry of email to {msg['To']}")
+
+    def join(self, timeout=None):
+        """Wait until the queued messages are handled (used by checks and tests)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue is not None and self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stats(self):
+        with self._lock:
+            sent, failed, retried = self.sent, self.failed, self.retried
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "sent": sent,
+            "failed": failed,
+            "retried": retried,
+        }
+
+
+mail_queue = MailQueue()
@@ -0,0 +1,425 @@
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+
+from flask import g, request
+
+from logger.log_utility import base_logger
+
+# request latency buckets in seconds, from a cached JSON call to a slow export
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ARCHIVE_FILE = "archive.json"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """A named family of values, one per combination of label values"""
+
+    kind = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def snapshot(self):
+        with self.registry.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, total, **labels):
+        """Mirror a count another object already keeps (cache hits, pool checkouts)"""
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = total
+
+
+class Gauge(Metric):
+    """Summed over live processes; a process that exits takes its values with it"""
+
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.registry.lock:
+            counts, total = self.values.get(key) or ([0] * len(self.buckets), 0.0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def snapshot(self):
+        with self.registry.lock:
+            return [[list(key), list(counts), total] for key, (counts, total) in self.values.items()]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class MetricsRegistry:
+    """
+    Prometheus metrics of the app, rendered in the text exposition format.
+
+    Every gunicorn worker has its own values. With a metrics directory (METRICS_DIR)
+    each process writes a snapshot there every flush_seconds and at exit, and the
+    worker answering a scrape adds them all up: counters and histograms of exited
+    workers keep counting (gunicorn's child_exit hook folds them into an archive
+    file), gauges only count for processes that are alive and still flushing.
+    Without a directory only the answering process is reported.
+
+    Collectors registered with on_collect() run before every snapshot, to copy
+    figures kept elsewhere (pool, caches) into metrics.
+    """
+
+    def __init__(self, directory=None, flush_seconds=1.0):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.collectors = []
+        self._flusher_pid = None
+        self._flush_lock = threading.Lock()
+
+    def init_app(self, app):
+        cfg = app.config
+        self.directory = cfg.get("METRICS_DIR") or None
+        self.flush_seconds = cfg.get("METRICS_FLUSH_SECONDS", 1.0)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(_start_request)
+        app.after_request(_finish_request)
+        app.teardown_request(_teardown_request)
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def on_collect(self, collector):
+        self.collectors.append(collector)
+        return collector
+
+    def collect(self):
+        """This process' values: {name: {"kind": ..., "values": [...]}}"""
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception:
+                base_logger.exception(f"Metrics collector {collector.__name__} failed")
+        return {name: {"kind": metric.kind, "values": metric.snapshot()} for name, metric in self.metrics.items()}
+
+    # --- multi-process storage ---
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def ensure_flusher(self):
+        """Start the snapshot thread of this process (after a fork the parent's thread is gone)"""
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self.lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+        atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except OSError:
+                base_logger.exception("Could not write metrics snapshot")
+
+    def flush(self):
+        if not self.directory:
+            return
+        snapshot = {"pid": os.getpid(), "written": time.time(), "metrics": self.collect()}
+        path = self._path(os.getpid())
+        # written aside and renamed, a scrape never reads half a file
+        with self._flush_lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
+
+    def _snapshots(self):
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    def merged(self):
+        """Values summed over every process, as {name: {label values: value}}"""
+        if not self.directory:
+            snapshots = [{"pid": os.getpid(), "written": time.time(), "metrics": self.collect()}]
+        else:
+            self.flush()
+            snapshots = self._snapshots()
+
+        stale_before = time.time() - max(10 * self.flush_seconds, 10)
+        merged = {name: {} for name in self.metrics}
+        for snapshot in snapshots:
+            live = snapshot.get("pid") is not None and snapshot["written"] >= stale_before
+            for name, data in snapshot["metrics"].items():
+                if name not in merged or (data["kind"] == "gauge" and not live):
+                    continue
+                _merge_values(merged[name], data["kind"], data["values"])
+        return merged
+
+    def render(self):
+        """Text exposition format, version 0.0.4"""
+        merged = self.merged()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                if metric.kind == "histogram":
+                    counts, total = value
+                    cumulative = 0
+                    for bound, count in zip(metric.buckets, counts):
+                        cumulative += count
+                        le = (("le", _format_value(bound)),)
+                        lines.append(f"{name}_bucket{_format_labels(metric.labelnames, key, le)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(metric.labelnames, key)} {_format_value(total)}")
+                    lines.append(f"{name}_count{_format_labels(metric.labelnames, key)} {cumulative}")
+                else:
+                    lines.append(f"{name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+        lines.extend(_hit_ratios(merged))
+        return "\n".join(lines) + "\n"
+
+
+def _merge_values(into, kind, values):
+    for entry in values:
+        key = tuple(entry[0])
+        if kind == "histogram":
+            counts, total = into.get(key) or ([0] * len(entry[1]), 0.0)
+            into[key] = ([a + b for a, b in zip(counts, entry[1])], total + entry[2])
+        else:
+            into[key] = into.get(key, 0) + entry[1]
+
+
+def mark_process_dead(pid, directory):
+    """
+    Fold an exited worker's counters and histograms into the archive file and drop
+    its snapshot (and with it its gauges). Call from the gunicorn master only.
+    """
+    path = os.path.join(directory, f"metrics_{pid}.json")
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return
+
+    archive_path = os.path.join(directory, ARCHIVE_FILE)
+    try:
+        with open(archive_path) as f:
+            archive = json.load(f)
+    except (OSError, ValueError):
+        archive = {"pid": None, "written": 0, "metrics": {}}
+
+    for name, data in snapshot["metrics"].items():
+        if data["kind"] == "gauge":
+            continue
+        merged = {}
+        previous = archive["metrics"].get(name)
+        if previous:
+            _merge_values(merged, data["kind"], previous["values"])
+        _merge_values(merged, data["kind"], data["values"])
+        archive["metrics"][name] = {
+            "kind": data["kind"],
+            "values": [
+                [list(key), list(value[0]), value[1]] if data["kind"] == "histogram" else [list(key), value]
+                for key, value in merged.items()
+            ],
+        }
+
+    with open(archive_path + ".tmp", "w") as f:
+        json.dump(archive, f)
+    os.replace(archive_path + ".tmp", archive_path)
+    os.remove(path)
+
+
+def clear_directory(directory):
+    """Forget the snapshots of a previous server run"""
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+
+
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    "http_request_duration_seconds", "Time to answer a request", ["endpoint", "method"])
+requests_total = metrics.counter(
+    "http_requests_total", "Requests answered", ["endpoint", "method", "status"])
+requests_in_flight = metrics.gauge(
+    "http_requests_in_flight", "Requests being handled right now", ["endpoint"])
+pool_connections = metrics.gauge(
+    "db_pool_connections", "Database connections held by the pools, by state", ["state"])
+pool_size = metrics.gauge("db_pool_size", "Configured pool size summed over processes")
+pool_checkouts = metrics.counter("db_pool_checkouts_total", "Connections handed out by the pools")
+pool_timeouts = metrics.counter("db_pool_timeouts_total", "Checkouts that waited longer than DB_POOL_TIMEOUT")
+pool_wait = metrics.counter("db_pool_wait_seconds_total", "Time spent waiting for a pooled connection")
+cache_requests = metrics.counter(
+    "cache_requests_total", "Cache lookups by outcome", ["cache", "result"])
+mail_queue_depth = metrics.gauge("mail_queue_depth", "Emails waiting for a mail worker")
+mail_messages = metrics.counter(
+    "mail_messages_total", "Emails sent, given up on, or scheduled for another attempt", ["result"])
+otp_email_duration = metrics.histogram(
+    "otp_email_duration_seconds", "Time _send_otp_via_email keeps the request waiting", ["result"])
+smtp_send_duration = metrics.histogram(
+    "smtp_send_duration_seconds", "Time to hand one message to the SMTP server", ["result"])
+
+
+@metrics.on_collect
+def _collect_pool():
+    from .pool import pool_metrics
+
+    stats = pool_metrics.stats()
+    for state in ("checked_out", "idle", "overflow"):
+        pool_connections.set(stats[state], state=state)
+    pool_size.set(stats["size"])
+    pool_checkouts.set_total(pool_metrics.checkouts)
+    pool_timeouts.set_total(pool_metrics.timeouts)
+    pool_wait.set_total(pool_metrics.wait_seconds)
+
+
+@metrics.on_collect
+def _collect_caches():
+    from .cache import dashboard_cache
+    from .identity import identity_cache
+    from .mailer import mail_queue
+
+    for name, cache in (("dashboard", dashboard_cache), ("identity", identity_cache)):
+        cache_requests.set_total(cache.hits, cache=name, result="hit")
+        cache_requests.set_total(cache.misses, cache=name, result="miss")
+    mail = mail_queue.stats()
+    mail_queue_depth.set(mail["queued"])
+    for result in ("sent", "failed", "retried"):
+        mail_messages.set_total(mail[result], result=result)
+
+
+def _hit_ratios(merged):
+    """cache_hit_ratio from the summed lookups, a ratio per process could not be added up"""
+    lookups = {}
+    for (cache, result), count in merged.get("cache_requests_total", {}).items():
+        hits, total = lookups.get(cache, (0, 0))
+        lookups[cache] = (hits + (count if result == "hit" else 0), total + count)
+    if not lookups:
+        return []
+    lines = ["# HELP cache_hit_ratio Share of cache lookups answered from the cache",
+             "# TYPE cache_hit_ratio gauge"]
+    for cache, (hits, total) in sorted(lookups.items()):
+        lines.append(f'cache_hit_ratio{{cache="{_escape(cache)}"}} {_format_value(hits / total if total else 0.0)}')
+    return lines
+
+
+def _endpoint():
+    # unmatched paths (404s) share one label, so scanners cannot blow up the series count
+    return request.endpoint or "unmatched"
+
+
+def _start_request():
+    metrics.ensure_flusher()
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = _endpoint()
+    requests_in_flight.inc(endpoint=g.metrics_endpoint)
+
+
+def _finish_request(response):
+    started = g.get("metrics_started")
+    if started is not None:
+        request_duration.observe(time.perf_counter() - started, endpoint=_endpoint(), method=request.method)
+        requests_total.inc(endpoint=_endpoint(), method=request.method, status=response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    endpoint = g.pop("metrics_endpoint", None)
+    if endpoint is not None:
+        requests_in_flight.dec(endpoint=endpoint)
@@ -0,0 +1,118 @@
+import hmac
+import secrets
+
+from .cache import MemoryBackend, RedisBackend
+
+OTP_TTL_SECONDS = 5 * 60
+MAX_ATTEMPTS = 5
+# new codes per flow; the attempt budget is shared by all of them
+MAX_RESENDS = 3
+
+# results of OtpStore.verify
+VERIFIED = "verified"
+INVALID = "invalid"
+EXPIRED = "expired"
+LOCKED = "locked"
+
+
+def generate_otp():
+    return f"{secrets.randbelow(1000000):06d}"
+
+
+class OtpStore:
+    """
+    Server-side state of the OTP flows ("login", "reset"). The cookie session only
+    carries an opaque token; the code, its owner and the attempt counter live in the
+    backend and expire with the OTP, so nothing has to parse expiry timestamps.
+
+    Each entry caches the minimal user record (id, email, verified flag) needed by
+    the verify and resend paths. Use the Redis backend when running several workers.
+    """
+
+    def __init__(self, backend=None, ttl=OTP_TTL_SECONDS, max_attempts=MAX_ATTEMPTS, max_resends=MAX_RESENDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_attempts = max_attempts
+        self.max_resends = max_resends
+
+    def init_app(self, app):
+        cfg = app.config
+        self.ttl = cfg.get("OTP_TTL_SECONDS", OTP_TTL_SECONDS)
+        self.max_attempts = cfg.get("OTP_MAX_ATTEMPTS", MAX_ATTEMPTS)
+        self.max_resends = cfg.get("OTP_MAX_RESENDS", MAX_RESENDS)
+        if cfg.get("OTP_STORE_BACKEND", "memory") == "redis":
+            self.backend = RedisBackend(cfg.get("OTP_STORE_URL", "redis://localhost:6379/0"))
+        else:
+            self.backend = MemoryBackend(cfg.get("OTP_STORE_MAX_ENTRIES", 10000))
+
+    @staticmethod
+    def _key(purpose, token):
+        return f"otp:{purpose}:{token}"
+
+    def start(self, purpose, user):
+        """Begin an OTP flow for a User, returns (token, otp)"""
+        token = secrets.token_urlsafe(24)
+        otp = generate_otp()
+        record = {
+            "otp": otp,
+            "user_id": user.user_id,
+            "email": user.email,
+            "is_verified": bool(user.is_verified),
+            "verified": False,
+            "resends": 0,
+        }
+        self.backend.set(self._key(purpose, token), record, self.ttl)
+        return token, otp
+
+    def get(self, purpose, token):
+        """The live entry of a flow, None once it expired or was cleared"""
+        if not token:
+            return None
+        return self.backend.get(self._key(purpose, token))
+
+    def resend(self, purpose, token):
+        """
+        Replace the code of a live flow and restart its expiry. The attempts already
+        made still count, and after max_resends the flow is dropped.
+        Returns (otp, record) or None when the flow is gone.
+        """
+        record = self.get(purpose, token)
+        if record is None:
+            return None
+        if record.get("resends", 0) >= self.max_resends:
+            self.clear(purpose, token)
+            return None
+        record["otp"] = generate_otp()
+        record["resends"] = record.get("resends", 0) + 1
+        self.backend.set(self._key(purpose, token), record, self.ttl)
+        return record["otp"], record
+
+    def verify(self, purpose, token, submitted):
+        """
+        Check a submitted code; returns (VERIFIED | INVALID | EXPIRED | LOCKED, record).
+        Every submission counts against max_attempts, the flow is dropped once they are used up.
+        """
+        record = self.get(purpose, token)
+        if record is None:
+            return EXPIRED, None
+
+        # outlives every expiry a resend can add, so the budget covers the whole flow
+        attempts = self.backend.incr(self._key(purpose, token) + ":attempts", self.ttl * (self.max_resends + 1))
+        if attempts > self.max_attempts:
+            self.clear(purpose, token)
+            return LOCKED, record
+
+        if not hmac.compare_digest(record["otp"], submitted or ""):
+            return INVALID, record
+
+        record["verified"] = True
+        self.backend.set(self._key(purpose, token), record, self.ttl)
+        return VERIFIED, record
+
+    def clear(self, purpose, token):
+        if token:
+            self.backend.delete(self._key(purpose, token))
+            self.backend.delete(self._key(purpose, token) + ":attempts")
+
+
+otp_store = OtpStore()
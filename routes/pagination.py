@@ -0,0 +1,75 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    """Raised when an `after` cursor cannot be decoded."""
+
+
+def encode_cursor(date_value, row_id):
+    """
+    Opaque keyset cursor for the (date, id) of the last row of a page
+    """
+    payload = json.dumps([date_value.isoformat() if date_value else None, row_id])
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, date_column):
+    """
+    Inverse of encode_cursor, returns (date or None, id)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_str, row_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if date_str is None:
+            return None, int(row_id)
+        if isinstance(date_column.type, DateTime):
+            return datetime.fromisoformat(date_str), int(row_id)
+        return date.fromisoformat(date_str), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}") from e
+
+
+def clamp_limit(limit):
+    """Parse a user supplied page size, falling back to the default and capping it."""
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_page(query, date_column, id_column, after=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of `query` ordered newest first by (date DESC NULLS FIRST, id DESC).
+    Rows without a date come first, matching a backward scan of the (user_id, date) indexes.
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    query = query.order_by(date_column.desc().nulls_first(), id_column.desc())
+
+    if after:
+        after_date, after_id = decode_cursor(after, date_column)
+        if after_date is None:
+            query = query.filter(or_(
+                and_(date_column.is_(None), id_column < after_id),
+                date_column.isnot(None),
+            ))
+        else:
+            query = query.filter(or_(
+                date_column < after_date,
+                and_(date_column == after_date, id_column < after_id),
+            ))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, date_column.key), getattr(last, id_column.key))
@@ -0,0 +1,143 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+
+
+# Run inside the pool processes: keep them importable without the Flask app
+def _hash(password, rounds, prefix):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds, prefix=prefix)).decode("utf-8")
+
+
+def _check(password_hash, password):
+    return bcrypt.checkpw(password, password_hash)
+
+
+def _pool_context():
+    """
+    forkserver where available: forking a gthread worker copies whatever locks its
+    other threads hold at that moment, while the fork server is a single-threaded
+    process started once, which the pool workers are forked from. spawn elsewhere (Windows).
+    Both import the entry script as __mp_main__, which gunicorn and app.py guard.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    if "forkserver" not in methods:
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # imported once in the server instead of in every pool worker
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing on a dedicated process pool, so login/register bursts use at most
+    `workers` cores and request threads only wait on a future instead of competing
+    for CPU. Hashes are compatible with Flask-Bcrypt (same config keys, $2b$ prefix).
+
+    workers = 0 hashes in the calling thread.
+    """
+
+    def __init__(self):
+        self.rounds = 12
+        self.prefix = b"2b"
+        self.handle_long_passwords = False
+        self.workers = 0
+        self._pool = None
+        self._pool_pid = None
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.max_pending = 0
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def init_app(self, app):
+        cfg = app.config
+        self.rounds = cfg.get("BCRYPT_LOG_ROUNDS", 12)
+        self.prefix = cfg.get("BCRYPT_HASH_PREFIX", "2b").encode("ascii")
+        self.handle_long_passwords = cfg.get("BCRYPT_HANDLE_LONG_PASSWORDS", False)
+        self.workers = cfg.get("BCRYPT_POOL_WORKERS", 2)
+
+    def _executor(self):
+        # created on first use and per process, a pool inherited through fork is not usable
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=_pool_context())
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _reset_pool(self):
+        with self._lock:
+            self._pool = None
+
+    def _run(self, fn, *args):
+        started = time.perf_counter()
+        with self._lock:
+            self.pending += 1
+            self.max_pending = max(self.max_pending, self.pending)
+        try:
+            if not self.workers:
+                return fn(*args)
+            try:
+                return self._executor().submit(fn, *args).result()
+            except BrokenProcessPool:
+                # a worker died (e.g. OOM killed); start a fresh pool next time, answer inline now
+                self._reset_pool()
+                return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.pending -= 1
+                self.calls += 1
+                self.total_seconds += elapsed
+                self.max_seconds = max(self.max_seconds, elapsed)
+
+    def _password_bytes(self, password):
+        password = password.encode("utf-8") if isinstance(password, str) else password
+        if self.handle_long_passwords:
+            password = hashlib.sha256(password).hexdigest().encode("ascii")
+        return password
+
+    def hash(self, password):
+        if not password:
+            raise ValueError("Password must be non-empty.")
+        return self._run(_hash, self._password_bytes(password), self.rounds, self.prefix)
+
+    def check(self, password_hash, password):
+        if not password_hash or not password:
+            return False
+        try:
+            return self._run(_check, password_hash.encode("utf-8"), self._password_bytes(password))
+        except ValueError:
+            # malformed hash, or a password bcrypt refuses (over 72 bytes)
+            return False
+
+    def cost(self, password_hash):
+        """Work factor of a $2b$NN$... hash, None if it cannot be read"""
+        try:
+            return int(password_hash.split("$")[2])
+        except (AttributeError, IndexError, ValueError):
+            return None
+
+    def needs_rehash(self, password_hash):
+        return self.cost(password_hash) != self.rounds
+
+    def stats(self):
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "queue_depth": self.pending,
+            "max_queue_depth": self.max_pending,
+            "calls": self.calls,
+            "avg_ms": self.total_seconds / self.calls * 1000 if self.calls else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+password_hasher = PasswordHasher()
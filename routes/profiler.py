@@ -0,0 +1,247 @@
+import heapq
+import itertools
+import random
+import re
+import threading
+import time
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from logger.log_utility import base_logger
+
+# distinct statement shapes aggregated per process, later ones are only counted as dropped
+MAX_FINGERPRINTS = 500
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+# expanded IN lists: (?, ?, ?) or (%(id_1_1)s, %(id_1_2)s) -> (...)
+_PLACEHOLDER_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)")
+
+
+def fingerprint(statement):
+    """
+    Statement text with literals replaced and IN lists collapsed: the same query
+    with different values gives the same fingerprint, and no value is kept
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING_LITERAL.sub("'?'", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    return _PLACEHOLDER_LIST.sub("(...)", statement)
+
+
+def redact_parameters(parameters, executemany):
+    """Only the shape of the bound parameters: their types, or the batch size of an executemany"""
+    if executemany:
+        return f"{len(parameters)} rows"
+    values = parameters.values() if isinstance(parameters, dict) else parameters or ()
+    types = [type(value).__name__ for value in values]
+    if len(types) > 8:
+        return f"{len(types)} values: {', '.join(sorted(set(types)))}"
+    return ", ".join(types)
+
+
+class RequestProfile:
+    """Statements of one sampled request"""
+
+    def __init__(self, top):
+        self.top = top
+        self.statements = 0
+        self.seconds = 0.0
+        self.repeats = {}
+        self._slowest = []
+        self._order = itertools.count()
+
+    def record(self, statement, parameters, executemany, seconds):
+        self.statements += 1
+        self.seconds += seconds
+        shape = fingerprint(statement)
+        if not executemany:
+            self.repeats[shape] = self.repeats.get(shape, 0) + 1
+        entry = (seconds, next(self._order), shape, redact_parameters(parameters, executemany))
+        if len(self._slowest) < self.top:
+            heapq.heappush(self._slowest, entry)
+        else:
+            heapq.heappushpop(self._slowest, entry)
+        return shape
+
+    def slowest(self):
+        return [
+            {"ms": seconds * 1000, "statement": shape, "parameters": parameters}
+            for seconds, _, shape, parameters in sorted(self._slowest, reverse=True)
+        ]
+
+    def repeated(self, threshold):
+        """SELECT shapes issued `threshold` or more times: a query per row of an earlier result (N+1)"""
+        return {
+            shape: count for shape, count in self.repeats.items()
+            if count >= threshold and shape.upper().startswith("SELECT")
+        }
+
+
+class QueryProfiler:
+    """
+    SQL instrumentation through SQLAlchemy cursor events, for a sampled share of
+    requests: statement count, database time, the slowest statements (values
+    redacted) and statements repeated often enough to look like N+1 loading.
+
+    Sampled requests are aggregated per endpoint and per statement shape for
+    /internal/metrics. Statements slower than slow_ms are logged whether or not the
+    request is sampled. With the debug header on (QUERY_PROFILE_HEADER or a debug
+    app), every sampled response carries X-Query-Profile and Server-Timing (shown
+    in the browser devtools' timing panel), and a request can ask to be sampled by
+    sending X-Query-Profile: 1.
+
+    Requests that are not sampled cost a random() call, plus two perf_counter()
+    calls and a request-context lookup per statement.
+    """
+
+    def __init__(self, sample_rate=0.0, header=False, slow_ms=500, top=5, n_plus_one=5):
+        self.sample_rate = sample_rate
+        self.header = header
+        self.slow_ms = slow_ms
+        self.top = top
+        self.n_plus_one = n_plus_one
+        self._lock = threading.Lock()
+        self._listening = False
+        self.reset()
+
+    def init_app(self, app):
+        cfg = app.config
+        self.sample_rate = cfg.get("QUERY_PROFILE_SAMPLE_RATE", 0.0)
+        # app.debug is read per request: app.run(debug=True) sets it after init_app
+        self.header = cfg.get("QUERY_PROFILE_HEADER", False)
+        self.slow_ms = cfg.get("QUERY_PROFILE_SLOW_MS", 500)
+        self.top = cfg.get("QUERY_PROFILE_TOP_STATEMENTS", 5)
+        self.n_plus_one = cfg.get("QUERY_PROFILE_N_PLUS_ONE", 5)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        if not self._listening:
+            # class level, so the engine Flask-SQLAlchemy creates lazily is covered too
+            event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            self._listening = True
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.sampled = 0
+            self.endpoints = {}
+            self.statements = {}
+            self.dropped_statements = 0
+            self.n_plus_one_patterns = {}
+
+    @staticmethod
+    def _current():
+        return g.get("query_profile") if has_request_context() else None
+
+    def _header_on(self):
+        return self.header or current_app.debug
+
+    def _start_request(self):
+        with self._lock:
+            self.requests += 1
+        forced = self._header_on() and request.headers.get("X-Query-Profile") == "1"
+        if forced or (self.sample_rate and random.random() < self.sample_rate):
+            g.query_profile = RequestProfile(self.top)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # every statement is timed for the slow query log, sampled or not
+        context._query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_query_started", None)
+        if started is None:
+            return
+        seconds = time.perf_counter() - started
+        profile = self._current()
+        shape = profile.record(statement, parameters, executemany, seconds) if profile is not None else None
+        if seconds * 1000 >= self.slow_ms:
+            endpoint = request.endpoint if has_request_context() else None
+            base_logger.warning(
+                f"slow_query endpoint={endpoint} ms={seconds * 1000:.1f} "
+                f"parameters={redact_parameters(parameters, executemany)} statement={shape or fingerprint(statement)}"
+            )
+
+    def _finish_request(self, response):
+        profile = g.pop("query_profile", None)
+        if profile is None:
+            return response
+
+        repeated = profile.repeated(self.n_plus_one)
+        self._aggregate(request.endpoint or request.path, profile, repeated)
+        if self._header_on():
+            db_ms = profile.seconds * 1000
+            response.headers["X-Query-Profile"] = (
+                f"statements={profile.statements}; db_ms={db_ms:.1f}; n_plus_one={len(repeated)}"
+            )
+            response.headers.add("Server-Timing", f'db;dur={db_ms:.1f};desc="{profile.statements} statements"')
+            slowest = profile.slowest()
+            if slowest:
+                response.headers["X-Query-Slowest"] = f"{slowest[0]['ms']:.1f}ms {slowest[0]['statement'][:200]}"
+        return response
+
+    def _aggregate(self, endpoint, profile, repeated):
+        with self._lock:
+            self.sampled += 1
+            totals = self.endpoints.setdefault(endpoint, {
+                "requests": 0, "statements": 0, "max_statements": 0, "db_ms": 0.0, "max_db_ms": 0.0,
+            })
+            db_ms = profile.seconds * 1000
+            totals["requests"] += 1
+            totals["statements"] += profile.statements
+            totals["max_statements"] = max(totals["max_statements"], profile.statements)
+            totals["db_ms"] += db_ms
+            totals["max_db_ms"] = max(totals["max_db_ms"], db_ms)
+
+            for entry in profile.slowest():
+                shape = self.statements.get(entry["statement"])
+                if shape is None:
+                    if len(self.statements) >= MAX_FINGERPRINTS:
+                        self.dropped_statements += 1
+                        continue
+                    shape = self.statements[entry["statement"]] = {
+                        "count": 0, "total_ms": 0.0, "max_ms": 0.0, "parameters": entry["parameters"],
+                    }
+                shape["count"] += 1
+                shape["total_ms"] += entry["ms"]
+                shape["max_ms"] = max(shape["max_ms"], entry["ms"])
+
+            for statement, count in repeated.items():
+                key = (endpoint, statement)
+                pattern = self.n_plus_one_patterns.get(key)
+                if pattern is None:
+                    if len(self.n_plus_one_patterns) >= MAX_FINGERPRINTS:
+                        continue
+                    pattern = self.n_plus_one_patterns[key] = {"requests": 0, "max_repeats": 0}
+                pattern["requests"] += 1
+                pattern["max_repeats"] = max(pattern["max_repeats"], count)
+
+    def stats(self, top=10):
+        with self._lock:
+            endpoints = {
+                endpoint: dict(totals,
+                               avg_statements=totals["statements"] / totals["requests"],
+                               avg_db_ms=totals["db_ms"] / totals["requests"])
+                for endpoint, totals in self.endpoints.items()
+            }
+            slowest = sorted(self.statements.items(), key=lambda item: item[1]["total_ms"], reverse=True)[:top]
+            n_plus_one = [
+                dict(pattern, endpoint=endpoint, statement=statement)
+                for (endpoint, statement), pattern in self.n_plus_one_patterns.items()
+            ]
+            return {
+                "sample_rate": self.sample_rate,
+                "requests": self.requests,
+                "sampled": self.sampled,
+                "endpoints": endpoints,
+                "slowest_statements": [dict(totals, statement=statement) for statement, totals in slowest],
+                "dropped_statements": self.dropped_statements,
+                "n_plus_one": n_plus_one,
+            }
+
+
+query_profiler = QueryProfiler()
@@ -0,0 +1,196 @@
+from datetime import date, timedelta
+from sqlalchemy import Date, delete, func, insert, select, text, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
+from .schema import (Expense, Loan, Insurance,
+                     ExpenseMonthly, LoanMonthly, InsuranceMonthly, db)
+from .categories import category_registry
+
+
+class month_start(FunctionElement):
+    """First day of the month of a date/datetime expression, as a DATE"""
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(month_start)
+def _month_start_default(element, compiler, **kw):
+    return "CAST(date_trunc('month', %s) AS DATE)" % compiler.process(element.clauses, **kw)
+
+
+@compiles(month_start, "sqlite")
+def _month_start_sqlite(element, compiler, **kw):
+    return "date(%s, 'start of month')" % compiler.process(element.clauses, **kw)
+
+
+# rollup table -> (source model, date column, amount column, grouping columns shared by both)
+ROLLUPS = {
+    ExpenseMonthly: (Expense, Expense.date, Expense.amount, ["user_id", "category_id"]),
+    LoanMonthly: (Loan, Loan.due_date, Loan.amount, ["user_id", "lender", "loan_category"]),
+    InsuranceMonthly: (Insurance, Insurance.renewal_date, Insurance.premium, ["user_id", "provider", "policy_type"]),
+}
+
+
+def rollups_cover(start_date, end_date):
+    """
+    True when the date range is made of whole months, so the monthly rollups
+    give exactly the same sums as the raw ledgers
+    """
+    starts_on_month = start_date is None or start_date.day == 1
+    ends_on_month = end_date is None or (end_date + timedelta(days=1)).day == 1
+    return starts_on_month and ends_on_month
+
+
+def _month_filters(rollup, start_date, end_date):
+    criteria = []
+    if start_date:
+        criteria.append(rollup.month >= start_date)
+    if end_date:
+        criteria.append(rollup.month <= end_date)
+    return criteria
+
+
+def expense_rollup_filters(user_id, selected_categories, start_date, end_date):
+    """
+    WHERE criteria on expense_monthly equivalent to routes.filters.expense_filters
+    for month aligned ranges
+    """
+    criteria = [ExpenseMonthly.user_id == user_id]
+    if selected_categories:
+        criteria.append(ExpenseMonthly.category_id.in_(category_registry.ids_for(selected_categories)))
+    return criteria + _month_filters(ExpenseMonthly, start_date, end_date)
+
+
+def loan_rollup_filters(user_id, selected_lenders, selected_categories, start_date, end_date):
+    """
+    WHERE criteria on loan_monthly equivalent to routes.filters.loan_filters
+    for month aligned ranges
+    """
+    criteria = [LoanMonthly.user_id == user_id]
+    if selected_lenders:
+        criteria.append(LoanMonthly.lender.in_(selected_lenders))
+    if selected_categories:
+        criteria.append(LoanMonthly.loan_category.in_(selected_categories))
+    return criteria + _month_filters(LoanMonthly, start_date, end_date)
+
+
+def insurance_rollup_filters(user_id, selected_providers, selected_types, start_date, end_date):
+    """
+    WHERE criteria on insurance_monthly equivalent to routes.filters.insurance_filters
+    for month aligned ranges
+    """
+    criteria = [InsuranceMonthly.user_id == user_id]
+    if selected_providers:
+        criteria.append(InsuranceMonthly.provider.in_(selected_providers))
+    if selected_types:
+        criteria.append(InsuranceMonthly.policy_type.in_(selected_types))
+    return criteria + _month_filters(InsuranceMonthly, start_date, end_date)
+
+
+def _upsert(conn, table, keys, amount, count=1):
+    """Add `count` rows worth of amount to a rollup bucket, creating it if needed."""
+    dialect = conn.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table).values(**keys, total=amount, count=count)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={"total": table.c.total + stmt.excluded.total, "count": table.c.count + stmt.excluded.count},
+        )
+        conn.execute(stmt)
+        return
+
+    result = conn.execute(
+        update(table)
+        .where(*(table.c[k] == v for k, v in keys.items()))
+        .values(total=table.c.total + amount, count=table.c.count + count)
+    )
+    if result.rowcount == 0:
+        conn.execute(insert(table).values(**keys, total=amount, count=count))
+
+
+def _rollup_for(model):
+    for rollup, (source, date_column, amount_column, keys) in ROLLUPS.items():
+        if source is model:
+            return rollup, date_column, amount_column, keys
+    return None
+
+
+def record_in_rollups(item):
+    """
+    Apply a newly added Expense/Loan/Insurance to its monthly rollup.
+    Runs in the caller's transaction, so the rollup commits (or rolls back) with the row.
+    """
+    config = _rollup_for(type(item))
+    if config is None:
+        return
+    rollup, date_column, amount_column, keys = config
+
+    item_date = getattr(item, date_column.key)
+    if item_date is None:
+        return
+
+    bucket = {k: getattr(item, k) for k in keys}
+    bucket["month"] = date(item_date.year, item_date.month, 1)
+    _upsert(db.session.connection(), rollup.__table__, bucket, getattr(item, amount_column.key) or 0)
+
+
+def record_rows_in_rollups(conn, model, rows):
+    """
+    Fold a batch of rows (dicts of column values) inserted into `model` outside the
+    ORM into its monthly rollup: one upsert per touched bucket instead of per row.
+    """
+    config = _rollup_for(model)
+    if config is None:
+        return
+    rollup, date_column, amount_column, keys = config
+
+    buckets = {}
+    for row in rows:
+        row_date = row.get(date_column.key)
+        if row_date is None:
+            continue
+        bucket = (*(row[k] for k in keys), date(row_date.year, row_date.month, 1))
+        total, count = buckets.get(bucket, (0, 0))
+        buckets[bucket] = (total + (row[amount_column.key] or 0), count + 1)
+
+    for bucket, (total, count) in buckets.items():
+        _upsert(conn, rollup.__table__, dict(zip([*keys, "month"], bucket)), total, count)
+
+
+def rebuild_rollups(conn, user_id=None, user_ids=None):
+    """
+    Recompute the monthly rollups from the raw ledgers, for one user, the users in
+    `user_ids` or everyone. Used for backfills, by migration 0002 and the seeders.
+
+    Safe next to a serving app: the ledgers are locked against writes (PostgreSQL
+    SHARE lock, SQLite's single writer) until the caller's transaction ends, so a
+    ledger row and its record_in_rollups() upsert land either before the rebuild
+    reads the ledger or after it commits. Reads are not blocked.
+    """
+    if conn.dialect.name == "postgresql":
+        ledgers = ", ".join(model.__tablename__ for model, *_ in ROLLUPS.values())
+        conn.execute(text(f"LOCK TABLE {ledgers} IN SHARE MODE"))
+    for rollup, (model, date_column, amount_column, keys) in ROLLUPS.items():
+        table = rollup.__table__
+        source = model.__table__
+        bucket = month_start(date_column).label("month")
+        key_columns = [source.c[k] for k in keys]
+
+        summary = (
+            select(*key_columns, bucket, func.sum(amount_column), func.count())
+            .where(date_column.isnot(None))
+            .group_by(*key_columns, bucket)
+        )
+        purge = delete(table)
+        if user_id is not None:
+            summary = summary.where(source.c.user_id == user_id)
+            purge = purge.where(table.c.user_id == user_id)
+        elif user_ids is not None:
+            summary = summary.where(source.c.user_id.in_(user_ids))
+            purge = purge.where(table.c.user_id.in_(user_ids))
+
+        conn.execute(purge)
+        conn.execute(insert(table).from_select([*keys, "month", "total", "count"], summary))
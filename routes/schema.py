@@ -3,6 +3,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_bcrypt import Bcrypt
 from flask_login import UserMixin, LoginManager
 from flask_mail import Mail
+from sqlalchemy import inspect, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from logger.log_utility import base_logger
+from .passwords import password_hasher
 
 db = SQLAlchemy()
 bcrypt = Bcrypt()
@@ -26,10 +30,18 @@ class User(db.Model, UserMixin):
     insurances = db.relationship("Insurance", backref="user", lazy=True)
 
     def set_password(self, password):
-        self.password_hash = bcrypt.generate_password_hash(password).decode("utf-8")
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return bcrypt.check_password_hash(self.password_hash, password)
+        """
+        Verify a password. A hash made with another work factor than BCRYPT_LOG_ROUNDS
+        is replaced by one at the configured cost (the caller commits it).
+        """
+        if not password_hasher.check(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def get_id(self):
         return str(self.user_id)
@@ -43,6 +55,10 @@ class Category(db.Model):
 
 class Expense(db.Model):
     __tablename__ = "expenses"
+    __table_args__ = (
+        db.Index("ix_expenses_user_date", "user_id", "date", postgresql_include=["amount", "category_id"]),
+        db.Index("ix_expenses_user_category_date", "user_id", "category_id", "date", postgresql_include=["amount"]),
+    )
     expense_id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)
     description = db.Column(db.String(200))
@@ -56,6 +72,9 @@ class Expense(db.Model):
 
 class Loan(db.Model):
     __tablename__ = "loans"
+    __table_args__ = (
+        db.Index("ix_loans_user_due_date", "user_id", "due_date", postgresql_include=["amount"]),
+    )
     loan_id = db.Column(db.Integer, primary_key=True)
     lender = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -68,6 +87,9 @@ class Loan(db.Model):
 
 class Insurance(db.Model):
     __tablename__ = "insurances"
+    __table_args__ = (
+        db.Index("ix_insurances_user_renewal_date", "user_id", "renewal_date", postgresql_include=["premium"]),
+    )
     insurance_id = db.Column(db.Integer, primary_key=True)
     provider = db.Column(db.String(100), nullable=False)
     policy_type = db.Column(db.String(50), nullable=False)
@@ -77,6 +99,36 @@ class Insurance(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), nullable=False)
 
 
+# Monthly rollups, maintained incrementally by routes.rollups on every insert
+class ExpenseMonthly(db.Model):
+    __tablename__ = "expense_monthly"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    category_id = db.Column(db.Integer, db.ForeignKey("categories.category_id"), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class LoanMonthly(db.Model):
+    __tablename__ = "loan_monthly"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    lender = db.Column(db.String(100), primary_key=True)
+    loan_category = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class InsuranceMonthly(db.Model):
+    __tablename__ = "insurance_monthly"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.user_id"), primary_key=True)
+    month = db.Column(db.Date, primary_key=True)
+    provider = db.Column(db.String(100), primary_key=True)
+    policy_type = db.Column(db.String(50), primary_key=True)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
 DEFAULT_CATEGORIES = [
     "Groceries",
     "Electricity",
@@ -91,12 +143,44 @@ DEFAULT_CATEGORIES = [
     "House Maintenance"
 ]
 
+def seed_default_categories(conn):
+    """Insert the DEFAULT_CATEGORIES that are missing, in one statement where the database can upsert."""
+    table = Category.__table__
+    dialect = conn.dialect.name
+
+    if dialect in ("postgresql", "sqlite"):
+        dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = dialect_insert(table).values([{"name": name} for name in DEFAULT_CATEGORIES])
+        conn.execute(stmt.on_conflict_do_nothing(index_elements=["name"]))
+        return
+
+    existing = set(conn.scalars(select(table.c.name).where(table.c.name.in_(DEFAULT_CATEGORIES))))
+    missing = [{"name": name} for name in DEFAULT_CATEGORIES if name not in existing]
+    if missing:
+        conn.execute(insert(table), missing)
+
+
+def prepare_schema(conn):
+    """Create missing tables, backfill rollup tables created just now and seed default categories."""
+    rollup_tables = [ExpenseMonthly.__tablename__, LoanMonthly.__tablename__, InsuranceMonthly.__tablename__]
+    inspector = inspect(conn)
+    missing_rollups = [name for name in rollup_tables if not inspector.has_table(name)]
+
+    db.metadata.create_all(conn)
+
+    # Rollup tables created just now start empty, backfill them from the ledgers
+    if missing_rollups:
+        from .rollups import rebuild_rollups
+        base_logger.info(f"Backfilling monthly rollups: {', '.join(missing_rollups)}")
+        rebuild_rollups(conn)
+    seed_default_categories(conn)
+
+
 def create_schema(app):
     """Create database structure and seed default categories if not already present."""
     with app.app_context():
-        db.create_all()
-        for name in DEFAULT_CATEGORIES:
-            if not Category.query.filter_by(name=name).first():
-                print(f"Seeding default category: {name}")
-                db.session.add(Category(name=name))
+        prepare_schema(db.session.connection())
         db.session.commit()
+
+        from .categories import category_registry
+        category_registry.invalidate()
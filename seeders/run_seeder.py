@@ -1,6 +1,6 @@
 import os
 import sys
-import subprocess
+import importlib
 
 # Get absolute path to project root (one level above this script)
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -59,8 +59,8 @@ def run_seeder():
             module_to_run = modules[choice]
             print(f"\n🚀 Running seeder: {module_to_run}\n")
 
-            # Run the seeder as a module
-            subprocess.run([sys.executable, "-m", module_to_run], check=False)
+            # Run the seeder in this process, it only needs a database connection
+            importlib.import_module(module_to_run).seed()
         else:
             print("⚠️  Skipped.\n")
             continue
@@ -1,51 +1,20 @@
 """
-Generate unique User records in batches with Faker.
-Ensures no duplicate emails are inserted.
-"""
-
-import random
-from faker import Faker
-from app import create_app
-from routes import db, bcrypt, User
-
-fake = Faker()
+Seed users through the bulk generator (seeders/generate.py): sampled with
+NumPy and loaded with COPY; ON CONFLICT on e-mail keeps re-runs from duplicating
+users. All of them have the password "password123".
 
-app = create_app()
-with app.app_context():
-    total_to_generate = 100000   # adjust as needed
-    batch_size = 500
-    inserted_count = 0
-
-    # Precompute one hashed password for all fake users
-    shared_password_hash = bcrypt.generate_password_hash("password123").decode("utf-8")
+Usage:
+  python -m seeders.seeds.seed_users
+"""
 
-    while inserted_count < total_to_generate:
-        batch = []
-        for _ in range(batch_size):
-            first_name = fake.first_name()
-            last_name = fake.last_name()
-            email = fake.unique.email()  # ensures uniqueness within Faker session
+from seeders.generate import main
 
-            # Check DB for existing email (important across multiple runs)
-            if User.query.filter_by(email=email).first():
-                continue  # skip duplicates
+TOTAL_RECORDS = 100000
 
-            is_verified = random.choice([True, False])
 
-            user = User(
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                password_hash=shared_password_hash,
-                is_verified=is_verified,
-            )
-            batch.append(user)
+def seed():
+    return main(["--tables", "users", "--users", str(TOTAL_RECORDS)])
 
-        if batch:
-            db.session.bulk_save_objects(batch)
-            db.session.commit()
-            inserted_count += len(batch)
-            print(f"✅ Inserted {inserted_count}/{total_to_generate} users so far...")
 
-    print(f"🎉 Done: Inserted {inserted_count} unique users")
-    print("ℹ️ All users have password: 'password123'")
+if __name__ == "__main__":
+    seed()
@@ -38,11 +38,13 @@ document.addEventListener("DOMContentLoaded", function () {
     });
   }
 
-  // Render small charts
-  renderSmallChart(document.getElementById("expenseChart"), "line", "Expenses", expenseData, "rgba(75,192,192,1)");
-  renderSmallChart(document.getElementById("loanChart"), "line", "Loan Amounts", loanData, "rgba(255,99,132,1)");
-  renderSmallChart(document.getElementById("insuranceChart"), "line", "Premiums", insuranceData, "rgba(54,162,235,1)");
-  renderSmallChart(document.getElementById("categoryChart"), "pie", "Categories", categoryData, "rgba(255,206,86,1)");
+  // Render small charts, kept so filter changes can redraw them in place
+  window.dashboardCharts = {
+    expense: renderSmallChart(document.getElementById("expenseChart"), "line", "Expenses", expenseData, "rgba(75,192,192,1)"),
+    loan: renderSmallChart(document.getElementById("loanChart"), "line", "Loan Amounts", loanData, "rgba(255,99,132,1)"),
+    insurance: renderSmallChart(document.getElementById("insuranceChart"), "line", "Premiums", insuranceData, "rgba(54,162,235,1)"),
+    category: renderSmallChart(document.getElementById("categoryChart"), "pie", "Categories", categoryData, "rgba(255,206,86,1)")
+  };
 
   // Click to open modal with bigger chart
   function showChartModal(chartType, type, label, data, borderColor) {
@@ -87,18 +89,18 @@ document.addEventListener("DOMContentLoaded", function () {
     bootstrapModal.show();
   }
 
-  // Add click handlers for all charts
-  document.getElementById("viewExpenseChartBtn").addEventListener("click", () =>
-    showChartModal("expense", "line", "Expenses", expenseData, "rgba(75,192,192,1)")
+  // Add click handlers for all charts (data is read at click time, filters may have changed it)
+  document.getElementById("viewExpenseChartBtn")?.addEventListener("click", () =>
+    showChartModal("expense", "line", "Expenses", window.dashboardData.expenseData, "rgba(75,192,192,1)")
   );
-  document.getElementById("viewLoanChartBtn").addEventListener("click", () =>
-    showChartModal("loan", "line", "Loan Amounts", loanData, "rgba(255,99,132,1)")
+  document.getElementById("viewLoanChartBtn")?.addEventListener("click", () =>
+    showChartModal("loan", "line", "Loan Amounts", window.dashboardData.loanData, "rgba(255,99,132,1)")
   );
-  document.getElementById("viewInsuranceChartBtn").addEventListener("click", () =>
-    showChartModal("insurance", "line", "Premiums", insuranceData, "rgba(54,162,235,1)")
+  document.getElementById("viewInsuranceChartBtn")?.addEventListener("click", () =>
+    showChartModal("insurance", "line", "Premiums", window.dashboardData.insuranceData, "rgba(54,162,235,1)")
   );
-  document.getElementById("viewCategoryChartBtn").addEventListener("click", () =>
-    showChartModal("category", "pie", "Categories", categoryData, "rgba(255,206,86,1)")
+  document.getElementById("viewCategoryChartBtn")?.addEventListener("click", () =>
+    showChartModal("category", "pie", "Categories", window.dashboardData.categoryData, "rgba(255,206,86,1)")
   );
 });
 
@@ -156,3 +158,208 @@ document.addEventListener("DOMContentLoaded", function () {
 
   });
 });
+
+// Full table modals: fetch further pages from the API when the sentinel row scrolls into view
+document.addEventListener("DOMContentLoaded", function () {
+  function formatCell(value) {
+    if (value === null || value === undefined) return "";
+    return typeof value === "number" ? value.toFixed(2) : value;
+  }
+
+  function setupTable(tbody) {
+    const sentinel = tbody.querySelector(".table-sentinel");
+    const columns = JSON.parse(tbody.dataset.columns);
+    let loading = false;
+
+    async function loadNextPage() {
+      const nextUrl = tbody.dataset.nextUrl;
+      if (loading || !nextUrl) return;
+      loading = true;
+
+      try {
+        const response = await fetch(nextUrl, { headers: { "Accept": "application/json" } });
+        if (!response.ok) throw new Error(`HTTP ${response.status}`);
+        const page = await response.json();
+
+        tbody.querySelectorAll(".table-empty").forEach(tr => tr.remove());
+        page.rows.forEach(row => {
+          const tr = document.createElement("tr");
+          columns.forEach(column => {
+            const td = document.createElement("td");
+            td.textContent = formatCell(row[column]);
+            tr.appendChild(td);
+          });
+          tbody.insertBefore(tr, sentinel);
+        });
+
+        if (page.next_url) {
+          tbody.dataset.nextUrl = page.next_url;
+        } else {
+          delete tbody.dataset.nextUrl;
+          sentinel.hidden = true;
+        }
+      } catch (err) {
+        sentinel.firstElementChild.textContent = "Could not load more rows.";
+        delete tbody.dataset.nextUrl;
+      } finally {
+        loading = false;
+      }
+
+      // Keep filling while the sentinel is still visible (short first pages)
+      if (tbody.dataset.nextUrl && isVisible(sentinel)) loadNextPage();
+    }
+
+    function isVisible(el) {
+      const rect = el.getBoundingClientRect();
+      return !el.hidden && rect.bottom > 0 && rect.top < window.innerHeight;
+    }
+
+    new IntersectionObserver(entries => {
+      if (entries.some(entry => entry.isIntersecting)) loadNextPage();
+    }).observe(sentinel);
+
+    // Replace the rows with the first page of `url`, e.g. after the filters change
+    return function reload(url, totalText) {
+      tbody.querySelectorAll("tr:not(.table-sentinel):not(.table-total)").forEach(tr => tr.remove());
+      tbody.querySelector(".table-total td:last-child").textContent = totalText;
+      sentinel.firstElementChild.textContent = "Loading more...";
+      sentinel.hidden = false;
+      tbody.dataset.nextUrl = url;
+      loadNextPage();
+    };
+  }
+
+  window.dashboardTables = {};
+  document.querySelectorAll("tbody[data-columns]").forEach(tbody => {
+    const modal = tbody.closest(".modal");
+    window.dashboardTables[modal.id] = setupTable(tbody);
+  });
+});
+
+// Filter modals: fetch only the affected ledger's series and redraw its charts in place
+document.addEventListener("DOMContentLoaded", function () {
+  const ledgers = {
+    expenses: {
+      charts: { expense: "expense_chart_data", category: "category_chart_data" },
+      data: { expenseData: "expense_chart_data", categoryData: "category_chart_data" },
+      totalId: "totalExpensesValue",
+      totalKey: "total_expenses",
+      table: "expenseFullModal"
+    },
+    loans: {
+      charts: { loan: "loan_chart_data" },
+      data: { loanData: "loan_chart_data" },
+      totalId: "totalLoansValue",
+      totalKey: "total_loans",
+      table: "loanFullModal"
+    },
+    insurances: {
+      charts: { insurance: "insurance_chart_data" },
+      data: { insuranceData: "insurance_chart_data" },
+      totalId: "totalPremiumValue",
+      totalKey: "total_premium",
+      table: "insuranceFullModal"
+    }
+  };
+
+  // url -> { etag, body } so unchanged series are revalidated with If-None-Match
+  const seriesCache = new Map();
+
+  async function fetchSeries(url) {
+    const cached = seriesCache.get(url);
+    const headers = { "Accept": "application/json" };
+    if (cached) headers["If-None-Match"] = cached.etag;
+
+    const response = await fetch(url, { headers, cache: "no-store" });
+    if (response.status === 304 && cached) return cached.body;
+    if (!response.ok) throw new Error(`HTTP ${response.status}`);
+
+    const body = await response.json();
+    const etag = response.headers.get("ETag");
+    if (etag) seriesCache.set(url, { etag, body });
+    return body;
+  }
+
+  function redraw(chart, data) {
+    if (!chart) return;
+    chart.data.labels = data.map(d => d.label);
+    chart.data.datasets[0].data = data.map(d => d.value);
+    chart.update();
+  }
+
+  document.querySelectorAll("form[data-chart-ledger]").forEach(form => {
+    form.addEventListener("submit", async function (e) {
+      e.preventDefault();
+      const ledger = ledgers[form.dataset.chartLedger];
+      const params = new URLSearchParams(new FormData(form));
+      for (const [key, value] of [...params]) {
+        if (!value) params.delete(key);
+      }
+      const query = params.toString();
+
+      let series;
+      try {
+        series = await fetchSeries(`/api/charts/${form.dataset.chartLedger}?${query}`);
+      } catch (err) {
+        form.submit(); // fall back to the full page render
+        return;
+      }
+
+      Object.entries(ledger.charts).forEach(([name, key]) => redraw(window.dashboardCharts?.[name], series[key]));
+      Object.entries(ledger.data).forEach(([name, key]) => { window.dashboardData[name] = series[key]; });
+
+      const totalText = Number(series[ledger.totalKey] || 0).toFixed(2);
+      document.getElementById(ledger.totalId).textContent = totalText;
+
+      const reloadTable = window.dashboardTables?.[ledger.table];
+      if (reloadTable) reloadTable(`/api/${form.dataset.chartLedger}?${query}`, totalText);
+
+      history.replaceState(null, "", `${window.location.pathname}?${query}`);
+      bootstrap.Modal.getInstance(form.closest(".modal"))?.hide();
+    });
+  });
+});
+
+document.addEventListener("DOMContentLoaded", async function () {
+  const cards = document.getElementById("analyticsCards");
+  if (!cards) return;
+
+  let analytics;
+  try {
+    const response = await fetch(cards.dataset.url, { headers: { "Accept": "application/json" } });
+    if (!response.ok) return;
+    analytics = await response.json();
+  } catch (err) {
+    return;
+  }
+
+  const money = value => (value === null || value === undefined) ? "-" : Number(value).toFixed(2);
+  const latest = analytics.latest || {};
+  document.getElementById("avg3mValue").textContent = money(latest.avg_3m);
+  document.getElementById("avg6mValue").textContent = money(latest.avg_6m);
+  document.getElementById("avg12mValue").textContent = money(latest.avg_12m);
+
+  if (analytics.forecast) {
+    document.getElementById("forecastMonth").textContent = `(${analytics.forecast.month})`;
+    document.getElementById("forecastValue").textContent = money(analytics.forecast.amount);
+  }
+
+  function fillList(id, items, format) {
+    const list = document.getElementById(id);
+    list.replaceChildren(...items.map(item => {
+      const li = document.createElement("li");
+      li.textContent = format(item);
+      return li;
+    }));
+    if (!items.length) list.textContent = "Nothing to report";
+  }
+
+  fillList("momList", analytics.month_over_month.slice(0, 5), m => {
+    const sign = m.delta > 0 ? "+" : "";
+    const pct = m.delta_pct === null ? "" : ` (${sign}${m.delta_pct.toFixed(0)}%)`;
+    return `${m.category}: ${sign}${money(m.delta)}${pct}`;
+  });
+  fillList("anomalyList", analytics.anomalies.slice(0, 5), a =>
+    `${a.date} ${a.category} ${money(a.amount)} (usually ${money(a.category_mean)})`
+  );
+});
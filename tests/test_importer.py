@@ -0,0 +1,155 @@
+import io
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, insert, select
+
+from routes.importer import (CategoryMapper, ImportRowError, _drop_existing, _ofx_tags, _parse_amount, _to_row,
+                             import_expenses, parse_csv, parse_ofx)
+from routes.schema import Category, Expense, User, db
+
+CATEGORIES = [(1, "Groceries"), (2, "Medicines")]
+
+
+@pytest.fixture
+def conn():
+    engine = create_engine("sqlite://")
+    db.metadata.create_all(engine)
+    with engine.connect() as conn:
+        conn.execute(insert(User.__table__), [{"user_id": 1, "first_name": "A", "last_name": "B",
+                                              "email": "a@b.c", "password_hash": "x"}])
+        conn.execute(insert(Category.__table__), [{"category_id": i, "name": name} for i, name in CATEGORIES])
+        conn.commit()
+        yield conn
+
+
+def _record(amount, debit=False, description="BigBasket", date="2024-05-01"):
+    return {"line": 2, "date": date, "amount": amount, "description": description, "category": None, "debit": debit}
+
+
+def _row(record, sign="negative"):
+    return _to_row(record, 1, lambda text: datetime.strptime(text, "%Y-%m-%d"), CategoryMapper(CATEGORIES), sign)
+
+
+def _expenses(conn):
+    return conn.execute(select(Expense.date, Expense.amount, Expense.description).order_by(Expense.expense_id)).all()
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1,234.50", 1234.5),
+    ("-1,234.50", -1234.5),
+    ("(12.00)", -12.0),
+    ("-₹ 99", -99.0),
+    ("₹1,200", 1200.0),
+    ("Rs. 1,200.00", 1200.0),
+    ("$ 15.25", 15.25),
+    ("USD -5.00", -5.0),
+    ("45.00-", -45.0),
+    (".5", 0.5),
+    ("", None),
+    (None, None),
+])
+def test_parse_amount(text, expected):
+    assert _parse_amount(text) == expected
+
+
+@pytest.mark.parametrize("text", ["abc", "-", "()", "₹"])
+def test_parse_amount_rejects_text_without_a_number(text):
+    with pytest.raises(ImportRowError):
+        _parse_amount(text)
+
+
+def test_signed_amounts_only_import_debits():
+    assert _row(_record("-120.50"))["amount"] == 120.5
+    assert _row(_record("50000", description="Salary")) is None
+    assert _row(_record("(30.00)"))["amount"] == 30.0
+
+
+def test_debit_column_amounts_are_expenses_whatever_the_sign():
+    assert _row(_record("120.50", debit=True))["amount"] == 120.5
+    assert _row(_record("120.50", debit=True), sign="positive")["amount"] == 120.5
+
+
+def test_sign_none_imports_every_non_zero_amount():
+    assert _row(_record("12", description="x"), sign=None)["amount"] == 12.0
+    assert _row(_record("-12", description="x"), sign=None)["amount"] == 12.0
+    assert _row(_record("0.00"), sign=None) is None
+    assert _row(_record(None, debit=True)) is None
+
+
+def test_row_resolves_category_from_description():
+    assert _row(_record("-10", description="Apollo pharmacy"))["category_id"] == 2
+    assert _row(_record("-10", description="Something else"))["category_id"] == 1
+
+
+def test_debit_column_skips_credit_lines():
+    stream = io.StringIO("Date,Narration,Withdrawal,Deposit\n2024-05-01,BigBasket,120.50,\n2024-05-02,Salary,,50000\n")
+    rows = [_row(record) for record in parse_csv(stream)]
+    assert [row["amount"] if row else None for row in rows] == [120.5, None]
+
+
+def test_drop_existing_counts_repeated_keys(conn):
+    day = datetime(2024, 5, 1, 9, 30)
+    conn.execute(insert(Expense.__table__), [{"user_id": 1, "category_id": 1, "date": day,
+                                              "amount": 3.5, "description": "Coffee"}])
+    rows = [{"date": datetime(2024, 5, 1), "amount": 3.5, "description": "Coffee"} for _ in range(3)]
+    known_up_to = conn.scalar(select(func.max(Expense.expense_id)))
+
+    matched = Counter()
+    assert len(_drop_existing(conn, 1, rows, known_up_to, matched)) == 2
+    # the existing row was paired off by the first chunk, a later chunk keeps all of its lines
+    assert len(_drop_existing(conn, 1, rows, known_up_to, matched)) == 3
+    # rows added after the import started are not treated as pre-existing
+    assert len(_drop_existing(conn, 1, rows, 0, Counter())) == 3
+
+
+def test_identical_lines_across_chunks_are_all_imported(conn):
+    statement = "Date,Description,Amount\n" + "2024-05-01,Coffee,-3.50\n" * 3 + "2024-05-02,Tea,-2\n"
+
+    stats = import_expenses(conn, 1, parse_csv(io.StringIO(statement)), sign="negative", chunk_size=1)
+    assert (stats["inserted"], stats["duplicates"]) == (4, 0)
+
+    # re-importing the same file finds every line, whatever the chunking
+    for chunk_size in (1, 2, 10):
+        stats = import_expenses(conn, 1, parse_csv(io.StringIO(statement)), sign="negative", chunk_size=chunk_size)
+        assert (stats["inserted"], stats["duplicates"]) == (0, 4)
+    assert len(_expenses(conn)) == 4
+
+
+def test_partly_imported_statement_only_adds_the_missing_lines(conn):
+    first = "Date,Description,Amount\n2024-05-01,Coffee,-3.50\n"
+    import_expenses(conn, 1, parse_csv(io.StringIO(first)), sign="negative")
+
+    full = first + "2024-05-01,Coffee,-3.50\n2024-05-03,Apollo,-30\n"
+    stats = import_expenses(conn, 1, parse_csv(io.StringIO(full)), sign="negative", chunk_size=1)
+    assert (stats["inserted"], stats["duplicates"]) == (2, 1)
+    assert [row.amount for row in _expenses(conn)] == [3.5, 3.5, 30.0]
+
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240501120000<TRNAMT>-120.50<NAME>BigBasket</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240502<TRNAMT>50000.00<NAME>Salary</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT</TRNTYPE>
+<DTPOSTED>20240503</DTPOSTED>
+<TRNAMT>-30.00</TRNAMT>
+<MEMO>Apollo pharmacy</MEMO>
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 7, 64, 65536])
+def test_ofx_tags_do_not_depend_on_block_boundaries(read_size):
+    assert list(_ofx_tags(io.StringIO(OFX), read_size)) == list(_ofx_tags(io.StringIO(OFX)))
+
+
+def test_parse_ofx_records():
+    records = list(parse_ofx(io.StringIO(OFX)))
+    assert [(r["date"], r["amount"], r["description"]) for r in records] == [
+        ("20240501", "-120.50", "BigBasket"),
+        ("20240502", "50000.00", "Salary"),
+        ("20240503", "-30.00", "Apollo pharmacy"),
+    ]
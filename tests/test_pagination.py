@@ -0,0 +1,155 @@
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import insert
+
+from routes.pagination import (DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, InvalidCursor, clamp_limit, decode_cursor,
+                               encode_cursor, keyset_page)
+from routes.schema import Category, Expense, Loan, User, db
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(insert(User.__table__), [{"user_id": 1, "first_name": "A", "last_name": "B",
+                                                     "email": "a@b.c", "password_hash": "x"}])
+        db.session.execute(insert(Category.__table__), [{"category_id": 1, "name": "Groceries"}])
+        db.session.commit()
+        yield app
+
+
+def _dates(start):
+    """Ledger dates with NULLs and runs of equal dates, in no particular order"""
+    days = [None, 3, 3, 3, None, 0, 7, 3, None, 0, 0, 12, 7, 1, None, 3, 5, 5, 12, 0]
+    return [None if day is None else start + timedelta(days=day) for day in days]
+
+
+@pytest.fixture
+def expenses(app):
+    db.session.execute(insert(Expense.__table__), [
+        {"user_id": 1, "category_id": 1, "amount": i + 1.0, "description": f"e{i}", "date": day}
+        for i, day in enumerate(_dates(datetime(2024, 5, 1, 10, 30)))
+    ])
+    db.session.commit()
+
+
+@pytest.fixture
+def loans(app):
+    db.session.execute(insert(Loan.__table__), [
+        {"user_id": 1, "lender": "SBI", "amount": i + 1.0, "loan_category": "Home Loan", "due_date": day}
+        for i, day in enumerate(_dates(date(2024, 5, 1)))
+    ])
+    db.session.commit()
+
+
+def _expected(rows, date_key, id_key):
+    """date DESC NULLS FIRST, id DESC"""
+    undated = sorted((r for r in rows if getattr(r, date_key) is None), key=lambda r: -getattr(r, id_key))
+    dated = sorted((r for r in rows if getattr(r, date_key) is not None),
+                   key=lambda r: (getattr(r, date_key), getattr(r, id_key)), reverse=True)
+    return [getattr(r, id_key) for r in undated + dated]
+
+
+def _walk(query, date_column, id_column, limit):
+    ids, after, pages = [], None, 0
+    while True:
+        rows, after = keyset_page(query, date_column, id_column, after, limit)
+        ids += [getattr(row, id_column.key) for row in rows]
+        pages += 1
+        assert pages <= 100
+        if after is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 5, 7, 19, 20, 21, 50])
+def test_expense_pages_list_every_row_once(app, expenses, limit):
+    expected = _expected(Expense.query.all(), "date", "expense_id")
+    ids, pages = _walk(Expense.query, Expense.date, Expense.expense_id, limit)
+    assert ids == expected
+    assert pages == max(1, -(-len(expected) // limit))
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 6, 20, 50])
+def test_date_column_pages_list_every_row_once(app, loans, limit):
+    expected = _expected(Loan.query.all(), "due_date", "loan_id")
+    ids, _ = _walk(Loan.query, Loan.due_date, Loan.loan_id, limit)
+    assert ids == expected
+
+
+def test_pages_of_a_filtered_query(app, expenses):
+    query = Expense.query.filter(Expense.amount > 5)
+    expected = _expected(query.all(), "date", "expense_id")
+    ids, _ = _walk(query, Expense.date, Expense.expense_id, 3)
+    assert ids == expected
+
+
+def test_cursor_on_a_null_date_continues_with_the_remaining_rows(app, expenses):
+    undated = _expected([e for e in Expense.query.all() if e.date is None], "date", "expense_id")
+    rows, after = keyset_page(Expense.query, Expense.date, Expense.expense_id, None, 2)
+    assert [row.expense_id for row in rows] == undated[:2]
+    assert decode_cursor(after, Expense.date) == (None, undated[1])
+
+    rows, _ = keyset_page(Expense.query, Expense.date, Expense.expense_id, after, 100)
+    assert [row.expense_id for row in rows][:len(undated) - 2] == undated[2:]
+    assert all(row.date is not None for row in rows[len(undated) - 2:])
+
+
+def test_empty_query_has_no_next_page(app):
+    assert keyset_page(Expense.query, Expense.date, Expense.expense_id, None, 10) == ([], None)
+
+
+@pytest.mark.parametrize("value", [datetime(2024, 5, 1, 10, 30, 15), None])
+def test_cursor_round_trip_on_datetime_column(value):
+    assert decode_cursor(encode_cursor(value, 42), Expense.date) == (value, 42)
+
+
+@pytest.mark.parametrize("value", [date(2024, 5, 1), None])
+def test_cursor_round_trip_on_date_column(value):
+    assert decode_cursor(encode_cursor(value, 7), Loan.due_date) == (value, 7)
+
+
+def _raw_cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64!",
+    "ÿÿ",
+    _raw_cursor("not json"),
+    _raw_cursor(json.dumps(["2024-05-01"])),
+    _raw_cursor(json.dumps(["2024-05-01", 1, 2])),
+    _raw_cursor(json.dumps(["2024-13-01", 1])),
+    _raw_cursor(json.dumps(["2024-05-01T10:00:00", 1])),
+    _raw_cursor(json.dumps(["2024-05-01", "x"])),
+    _raw_cursor(json.dumps(["2024-05-01", None])),
+    _raw_cursor(json.dumps([20240501, 1])),
+    _raw_cursor(json.dumps(42)),
+    _raw_cursor(json.dumps(None)),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, Loan.due_date)
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, DEFAULT_PAGE_SIZE),
+    ("", DEFAULT_PAGE_SIZE),
+    ("abc", DEFAULT_PAGE_SIZE),
+    ("1.5", DEFAULT_PAGE_SIZE),
+    ("0", 1),
+    ("-10", 1),
+    ("1", 1),
+    ("25", 25),
+    (str(MAX_PAGE_SIZE), MAX_PAGE_SIZE),
+    (str(MAX_PAGE_SIZE + 1), MAX_PAGE_SIZE),
+    (10 ** 9, MAX_PAGE_SIZE),
+])
+def test_clamp_limit(value, expected):
+    assert clamp_limit(value) == expected
@@ -0,0 +1,19 @@
+"""
+Production entry point.
+
+  gunicorn -c gunicorn.conf.py wsgi:app
+  gunicorn "app:create_app()"          # factory form, any WSGI server
+
+Set the worker count through WEB_WORKERS (or WEB_CONCURRENCY): create_app() refuses
+to start several workers on the per-process memory OTP store and dashboard cache.
+"""
+
+from app import create_app
+from routes import db
+
+app = create_app()
+
+# create_app() used the pool for the schema checks; with a preloaded app the
+# workers are forked from here and must not share those sockets
+with app.app_context():
+    db.engine.dispose()